@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def normalize_question(question):
+    return " ".join(WORD_RE.findall((question or "").lower()))
+
+
+def cache_scope(question, mode, history=None, resume_id=None, resume_text=None):
+    """Cache scope for an /ask request, or None when its answer must not be shared."""
+    # Any earlier turns can shape the answer, and they belong to one user's conversation
+    if history:
+        return None
+    if mode == 'resume':
+        if resume_id:
+            return resume_id
+        if resume_text:
+            # Same id ResumeRegistry would give an upload with these bytes
+            return hashlib.sha256(resume_text.encode('utf-8')).hexdigest()
+        return None
+    return 'global'
+
+
+class AnswerCache:
+    """LRU/TTL cache of generated answers keyed by (scope, normalized question).
+
+    Scope is "global" for Global mode and the resume hash for Smart mode. With
+    `similarity` > 0, a miss falls back to the cached question in the same scope
+    with the highest word-set Jaccard score, if it reaches that threshold. With
+    `path` set, entries are loaded at startup and written back every
+    `autosave_every` new answers (and by save()).
+    """
+
+    def __init__(self, max_entries=5000, ttl=7 * 24 * 3600, similarity=0.0, path=None, autosave_every=50):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.path = path
+        self.autosave_every = autosave_every
+        self._entries = OrderedDict()  # (scope, key) -> (answer, created)
+        self._index = {}  # (scope, word) -> set of keys, for similarity lookups
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer at a time, separate from lookups
+        self._saving = False
+        self._dirty = 0
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self.load()
+
+    def get(self, question, scope="global"):
+        key = normalize_question(question)
+        if not key:
+            return None
+        with self._lock:
+            answer = self._get((scope, key))
+            if answer is not None:
+                self.hits += 1
+                return answer
+            if self.similarity > 0:
+                match = self._most_similar(scope, key)
+                if match is not None:
+                    answer = self._get((scope, match))
+                    if answer is not None:
+                        self.similar_hits += 1
+                        return answer
+            self.misses += 1
+            return None
+
+    def put(self, question, answer, scope="global"):
+        key = normalize_question(question)
+        if not key or not answer:
+            return
+        with self._lock:
+            self._set((scope, key), answer, time.time())
+            self._dirty += 1
+            save = self.path and self._dirty >= self.autosave_every and not self._saving
+            if save:
+                self._saving = True
+        if save:
+            # Written on a background thread so the request that crossed the threshold does not wait for it
+            threading.Thread(target=self._autosave, name='answer-cache-save', daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def save(self):
+        """Write all entries to `path`; errors are logged, never raised."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                rows = [[scope, key, answer, created] for (scope, key), (answer, created) in self._entries.items()]
+                self._dirty = 0
+            directory = os.path.dirname(os.path.abspath(self.path))
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.', suffix='.tmp', dir=directory)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'version': 1, 'entries': rows}, f)
+                os.replace(tmp_path, self.path)
+            except (OSError, TypeError, ValueError):
+                log.exception("Could not save the answer cache to %s", self.path)
+                if tmp_path:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+
+    def _autosave(self):
+        try:
+            self.save()
+        finally:
+            with self._lock:
+                self._saving = False
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                rows = json.load(f).get('entries', [])
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            for scope, key, answer, created in rows:
+                self._set((scope, key), answer, created)
+
+    def _get(self, cache_key):
+        item = self._entries.get(cache_key)
+        if item is None:
+            return None
+        answer, created = item
+        if self.ttl and time.time() - created > self.ttl:
+            self._remove(cache_key)
+            return None
+        self._entries.move_to_end(cache_key)
+        return answer
+
+    def _set(self, cache_key, answer, created):
+        if cache_key in self._entries:
+            self._remove(cache_key)
+        self._entries[cache_key] = (answer, created)
+        scope, key = cache_key
+        for word in set(key.split()):
+            self._index.setdefault((scope, word), set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, cache_key):
+        del self._entries[cache_key]
+        scope, key = cache_key
+        for word in set(key.split()):
+            keys = self._index.get((scope, word))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[(scope, word)]
+
+    def _most_similar(self, scope, key):
+        words = set(key.split())
+        candidates = set()
+        for word in words:
+            candidates |= self._index.get((scope, word), set())
+        best, best_score = None, 0.0
+        for candidate in candidates:
+            other = set(candidate.split())
+            score = len(words & other) / len(words | other)
+            if score > best_score:
+                best, best_score = candidate, score
+        return best if best_score >= self.similarity else None
@@ -0,0 +1,49 @@
+import re
+
+# Smart-mode answers containing any of these are treated as templates and blocked
+FORBIDDEN_PHRASES = [
+    "template", "sample", "example", "generic", "fallback", "instructional", "structured", "suggested", "possible answer", "response:",
+    "this is a template", "here is a template", "here is an example", "here is a sample", "sample response", "for example", "for instance"
+]
+
+WORD_RE = re.compile(r"[a-z]{4,}")
+
+
+def _alternation(phrases):
+    # Longest first so overlapping phrases resolve the same way as the old per-phrase loop
+    return "|".join(re.escape(p) for p in sorted(set(phrases), key=len, reverse=True))
+
+
+def keywords(text):
+    """Lower-cased set of 4+ letter words, the unit every resume-overlap check compares."""
+    return set(WORD_RE.findall((text or "").lower()))
+
+
+class AnswerFilter:
+    """Smart-mode answer checks compiled once and shared by every request.
+
+    Each phrase list becomes a single alternation regex, so an answer is
+    scanned once per rule instead of once per phrase.
+    """
+
+    def __init__(self, forbidden_phrases=FORBIDDEN_PHRASES):
+        self.forbidden_re = re.compile(_alternation(forbidden_phrases))
+        self.max_forbidden_len = max(len(p) for p in forbidden_phrases)
+
+    def is_forbidden(self, answer):
+        return self.forbidden_re.search(answer.lower()) is not None
+
+    def has_overlap(self, answer, resume_keywords):
+        return not resume_keywords.isdisjoint(WORD_RE.findall(answer.lower()))
+
+    def classify(self, answer, resume_keywords):
+        """Return "blocked", "no_overlap" or "ok" for a Smart-mode answer."""
+        lowered = answer.lower()
+        if self.forbidden_re.search(lowered):
+            return "blocked"
+        if resume_keywords.isdisjoint(WORD_RE.findall(lowered)):
+            return "no_overlap"
+        return "ok"
+
+
+answer_filter = AnswerFilter()
@@ -1,37 +1,30 @@
     # ...existing code...
-from flask import Flask, request, jsonify, send_from_directory
-from werkzeug.utils import secure_filename
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_cors import CORS
+import logging
 import os
 import sys
 import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from pymongo import MongoClient
-from dotenv import load_dotenv
-
-import pathlib
-# Robust .env loading for EXE and dev
-def robust_load_dotenv():
-    # Try current working dir
-    dotenv_paths = [
-        pathlib.Path.cwd() / '.env',
-        pathlib.Path(__file__).parent / '.env'
-    ]
-    # If running in PyInstaller bundle, also try _MEIPASS
-    if hasattr(sys, '_MEIPASS'):
-        dotenv_paths.append(pathlib.Path(sys._MEIPASS) / '.env')
-    for dotenv_path in dotenv_paths:
-        if dotenv_path.exists():
-            load_dotenv(dotenv_path)
-            print(f"[DEBUG] Loaded .env from: {dotenv_path}")
-            break
-    else:
-        print("[WARNING] .env file not found in any expected location!")
 
+from env_loader import robust_load_dotenv
+import metrics
+from metrics import stage
+
+log = logging.getLogger(__name__)
 robust_load_dotenv()
-from gpt_engine import GPTEngine
-from resume_parser import extract_text_from_pdf
+from gpt_engine import GPTEngine, ERROR_ANSWER
+from single_flight import SingleFlight, flight_key
+from upload_store import UploadTooLarge
+from static_assets import StaticAssets, StaticMiddleware
+from server_common import (
+    ASK_BATCH_WORKERS, MAX_UPLOAD_BYTES, NO_CREDITS_ANSWER, SINGLE_FLIGHT_ENABLED, SSE_HEADERS, UPLOAD_DIR,
+    BatchCharge, Services, ask_body, batch_mode, batch_params, batch_questions, engine_kwargs, sse_event,
+    upload_too_large_body,
+)
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if PROJECT_ROOT not in sys.path:
@@ -46,55 +39,132 @@ def get_frontend_build_dir() -> str:
     return os.path.join(PROJECT_ROOT, 'frontend', 'build')
 
 FRONTEND_BUILD_DIR = get_frontend_build_dir()
-print(f"[DEBUG] Frontend build exists: {os.path.exists(FRONTEND_BUILD_DIR)}")
 
 # --- MongoDB Atlas connection ---
 # Replace with your actual MongoDB Atlas connection string
 MONGO_URI = os.environ.get('MONGO_URI', 'YOUR_MONGODB_ATLAS_CONNECTION_STRING')
-client = MongoClient(MONGO_URI)
-db = client['ai_assistant']
-users_col = db['users']
+_users_col = None
+_mongo_lock = threading.Lock()
+
+
+def users_collection():
+    # pymongo is imported and the client created on first use, so startup and /health don't wait for it
+    global _users_col
+    if _users_col is None:
+        with _mongo_lock:
+            if _users_col is None:
+                if MONGO_URI.startswith('mongomock://'):
+                    # In-memory user store for offline benchmarks (see bench/loadtest.py)
+                    import mongomock
+                    client = mongomock.MongoClient()
+                else:
+                    from pymongo import MongoClient
+                    client = MongoClient(MONGO_URI, maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)))
+                _users_col = client['ai_assistant']['users']
+    return _users_col
 
 def get_user(email):
-    return users_col.find_one({'email': email})
+    return users_collection().find_one({'email': email})
 
 def create_user(email, password):
     if get_user(email):
         return False
     hashed = generate_password_hash(password)
-    users_col.insert_one({'email': email, 'password': hashed, 'credits': 10})
+    users_collection().insert_one({'email': email, 'password': hashed, 'credits': 10})
     return True
 
 def authenticate(email, password):
-    user = get_user(email)
+    if not email or not password:
+        return False
+    if services.auth_cache.check(email, password):
+        return True
+    user = users_collection().find_one({'email': email}, {'password': True})
     if not user:
         return False
-    return check_password_hash(user['password'], password)
+    if check_password_hash(user['password'], password):
+        services.auth_cache.remember(email, password)
+        return True
+    return False
 
 def get_credits(email):
-    user = get_user(email)
+    user = users_collection().find_one({'email': email}, {'credits': True})
     if not user:
         return 0
     return user.get('credits', 0)
 
-def use_credit(email):
-    user = get_user(email)
-    if not user or user.get('credits', 0) <= 0:
-        return False
-    users_col.update_one({'email': email}, {'$inc': {'credits': -1}})
-    return True
+def use_credit(email, amount=1):
+    # Check and decrement in one round trip; returns the new balance, or None if too few credits were left
+    from pymongo import ReturnDocument
+    user = users_collection().find_one_and_update(
+        {'email': email, 'credits': {'$gte': amount}},
+        {'$inc': {'credits': -amount}},
+        projection={'credits': True},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not user:
+        return None
+    return user.get('credits', 0)
+
+def refund_credits(email, amount):
+    # Give back credits charged for answers that were never delivered; returns the new balance
+    from pymongo import ReturnDocument
+    user = users_collection().find_one_and_update(
+        {'email': email},
+        {'$inc': {'credits': amount}},
+        projection={'credits': True},
+        return_document=ReturnDocument.AFTER,
+    )
+    return (user or {}).get('credits', 0)
 
 app = Flask(__name__, static_folder=FRONTEND_BUILD_DIR, static_url_path='')
 
-# OS-safe absolute upload directory
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_DIR = os.path.join(BASE_DIR, 'uploads')
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_DIR
+# Requests with a larger Content-Length are refused with 413 before the body is read
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
 
 # Allow requests from frontend
 CORS(app)
 
+# Built by create_app(), not at import: resume_parser's spawned PDF workers re-import this
+# module when it is run as a script, and must not start engines, threads or caches of their own
+services = None
+gpt_engine = None
+inflight = None
+batch_pool = None
+_create_lock = threading.Lock()
+
+
+def create_app():
+    """Set up logging, caches, the OpenAI engine and the static fast path; returns app. Runs once."""
+    global services, gpt_engine, inflight, batch_pool
+    with _create_lock:
+        if services is not None:
+            return app
+        metrics.setup_logging()
+        log.debug("Frontend build exists: %s", os.path.exists(FRONTEND_BUILD_DIR))
+        # Log the OS type once at startup (cross-platform support); /health reports it per request
+        log.debug("Backend running on OS: %s %s (%s)", platform.system(), platform.release(), platform.platform())
+        # Frontend build served from memory, precompressed, by a WSGI fast path in front of Flask.
+        # STATIC_FAST_PATH=0 falls back to serve_frontend/send_static_file.
+        if os.environ.get('STATIC_FAST_PATH', '1') != '0' and os.path.isdir(FRONTEND_BUILD_DIR):
+            static_assets = StaticAssets(FRONTEND_BUILD_DIR, brotli_quality=int(os.environ.get('STATIC_BROTLI_QUALITY', 11)))
+            static_assets.start_compression()
+            app.wsgi_app = StaticMiddleware(app.wsgi_app, static_assets)
+            metrics.register_collector('static', static_assets.stats)
+        gpt_engine = GPTEngine()
+        inflight = SingleFlight()
+        # Threads answering /ask_batch questions across all requests
+        batch_pool = ThreadPoolExecutor(max_workers=ASK_BATCH_WORKERS, thread_name_prefix='ask-batch')
+        app_services = Services()
+        app_services.register_collectors(gpt_engine, inflight)
+        services = app_services
+    return app
+
+@app.errorhandler(413)
+@app.errorhandler(UploadTooLarge)
+def upload_too_large(e):
+    return jsonify(upload_too_large_body()), 413
+
 # --- Auth & Credits Endpoints ---
 @app.route('/signup', methods=['POST'])
 def signup():
@@ -111,6 +181,9 @@ def signup():
 @app.route('/logout', methods=['POST'])
 def logout():
     # For stateless JWT or sessionless, just return success. For session-based, clear session here.
+    data = request.get_json(silent=True) or {}
+    if data.get('email'):
+        services.auth_cache.forget(data['email'])
     return jsonify({'success': True, 'message': 'Logged out'})
 
 @app.route('/login', methods=['POST'])
@@ -140,114 +213,224 @@ def use_credit_route():
     email = data.get('email')
     password = data.get('password')
     if authenticate(email, password):
-        if use_credit(email):
-            credits = get_credits(email)
+        credits = use_credit(email)
+        if credits is not None:
             return jsonify({'success': True, 'credits': credits})
         else:
             return jsonify({'success': False, 'message': 'No credits left'}), 403
     else:
         return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
 
-gpt_engine = GPTEngine()
-
 @app.route('/listen', methods=['POST'])
 def listen():
     # Basic implementation: echo back received data or status
     data = request.get_json(silent=True) or {}
     return jsonify({'status': 'listening', 'received': data})
 
+@app.get('/metrics')
+def metrics_route():
+    # Prometheus text format: per-stage latency histograms, OpenAI token counts, cache stats
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.get('/health')
 def health():
+    return jsonify(services.health(gpt_engine, inflight))
+
+
+@app.route('/upload_resume', methods=['POST'])
+def upload_resume():
+    resume_file = request.files.get('resume')
+    if not resume_file:
+        return jsonify({'success': False, 'message': 'No resume file provided'}), 400
+    entry, cached = services.register_resume(resume_file)
     return jsonify({
-        'status': 'ok',
-        'os': platform.system(),
-        'release': platform.release(),
-        'platform': platform.platform()
+        'success': True,
+        'resume_id': entry.resume_id,
+        'resume_text': entry.text,
+        'cached': cached,
     })
 
 
+def error_response(error):
+    body, status = error
+    return jsonify(body), status
+
+
+def parse_ask_request():
+    """Read question, mode, history and resume from a multipart or JSON /ask body.
+
+    Returns (params, None) on success or (None, error_response).
+    """
+    multipart = bool(request.content_type and request.content_type.startswith('multipart/form-data'))
+    data = request.form if multipart else (request.get_json(silent=True) or {})
+    email = data.get('email', None)
+    # Block if user has no credits
+    if email and get_credits(email) <= 0:
+        return None, (jsonify({'answer': NO_CREDITS_ANSWER}), 403)
+    resume_file = request.files.get('resume') if multipart else None
+    entry = services.register_resume(resume_file)[0] if resume_file else None
+    params, error = services.ask_params(data, multipart, email, entry)
+    if error:
+        return None, error_response(error)
+    return params, None
+
+
+def generate_answer(params, scope):
+    def generate():
+        answer = gpt_engine.generate_response(params['question'], **engine_kwargs(params))
+        services.cache_answer(scope, params['question'], answer)
+        return answer
+
+    if not SINGLE_FLIGHT_ENABLED:
+        return generate()
+    key = flight_key(params['question'], params['mode'], params['resume_id'], params['resume_text'], params['history'])
+    answer, shared = inflight.do(key, generate)
+    if shared:
+        log.debug("Collapsed duplicate in-flight question: %r", params['question'])
+    return answer
+
+
+def answer_question(params):
+    scope = services.cache_scope(params)
+    answer = services.cached_answer(params, scope)
+    return answer if answer is not None else generate_answer(params, scope)
+
+
+@app.route('/session/clear', methods=['POST'])
+def clear_session():
+    data = request.get_json(silent=True) or {}
+    services.session_store.clear(data.get('session_id'))
+    return jsonify({'success': True})
+
+
 @app.route('/ask', methods=['POST'])
 def ask():
-    # Log the OS type for each request (cross-platform support)
-    print(f"[DEBUG] Backend running on OS: {platform.system()} {platform.release()} ({platform.platform()})")
-    # Block if user has no credits
-    email = None
-    if request.content_type and request.content_type.startswith('multipart/form-data'):
-        email = request.form.get('email', None)
-    else:
-        data = request.get_json(silent=True)
-        if data:
-            email = data.get('email', None)
-    if email:
-        user = get_user(email)
-        if not user or user.get('credits', 0) <= 0:
-            return jsonify({'answer': 'No credits left. Please purchase more credits to continue.'}), 403
-    # If multipart/form-data, handle file upload
-    if request.content_type and request.content_type.startswith('multipart/form-data'):
-        question = request.form.get('question', '')
-        mode = request.form.get('mode', 'global')
-        history = request.form.get('history', None)
-        resume_file = request.files.get('resume')
-        resume_text = None
-        if resume_file:
-            filename = secure_filename(resume_file.filename)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-            resume_file.save(file_path)
-            # Always use the same logic as desktop: parse PDF or text
-            if filename.lower().endswith('.pdf'):
-                resume_text = extract_text_from_pdf(file_path)
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return ask_stream()
+    with stage('ask_total'):
+        return _ask()
+
+
+def _ask():
+    params, error = parse_ask_request()
+    if error:
+        return error
+    answer = answer_question(params)
+    services.remember_turn(params, answer)
+    return jsonify(ask_body(params, answer))
+
+
+@app.route('/ask/stream', methods=['POST'])
+def ask_stream():
+    # Same inputs as /ask, answered as Server-Sent Events while the model is generating
+    params, error = parse_ask_request()
+    if error:
+        return error
+
+    def events():
+        if params['resume_id']:
+            yield sse_event('resume', {'resume_id': params['resume_id']})
+        if params['session_id']:
+            yield sse_event('session', {'session_id': params['session_id']})
+        scope = services.cache_scope(params)
+        cached = services.cached_answer(params, scope)
+        if cached is not None:
+            services.remember_turn(params, cached)
+            yield sse_event('token', {'text': cached})
+            yield sse_event('done', {'answer': cached})
+            return
+        for event, payload in gpt_engine.stream_response(params['question'], **engine_kwargs(params)):
+            if event == 'token':
+                yield sse_event('token', {'text': payload})
+            elif event == 'reset':
+                yield sse_event('reset', {})
             else:
-                # Try to parse as text, fallback to empty string if error
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        resume_text = f.read()
-                except Exception:
-                    resume_text = ''
-            # Debug print: show filename and first 200 chars of resume text
-            print(f"[DEBUG] Resume file received: {filename}")
-            print(f"[DEBUG] Resume text length: {len(resume_text) if resume_text else 0}")
-            print("[DEBUG] Resume text preview (first 200 chars):\n", (resume_text or '')[:200])
-            if not resume_text or not resume_text.strip():
-                print(f"[WARNING] Resume text is empty after extraction for file: {filename}")
-        else:
-            resume_text = None
-        # Parse history if present
-        import json as _json
-        if history:
-            try:
-                history = _json.loads(history)
-            except Exception:
-                history = []
-        else:
-            history = []
-        if not question:
-            return jsonify({'answer': 'No question provided.'}), 400
-        
-        # CRITICAL FIX: If Smart mode is requested, ALWAYS use resume mode regardless of resume_text
-        if mode == 'resume':
-            print(f"[DEBUG] Smart mode requested - using resume context (resume_text_len={len(resume_text) if resume_text else 0})")
-            if not resume_text or not resume_text.strip():
-                return jsonify({
-                    'answer': 'Could not extract any text from the uploaded resume. If your PDF is a scanned image, try a text-based PDF or upload a .txt file instead.',
-                    'resume_text': ''
-                }), 422
-            answer = gpt_engine.generate_response(question, resume_text=resume_text, mode="resume", history=history)
-            return jsonify({'answer': answer, 'resume_text': resume_text})
-        else:
-            # Global mode
-            answer = gpt_engine.generate_response(question, resume_text=resume_text, mode="global", history=history)
-            return jsonify({'answer': answer})
-    # Else, handle JSON (old flow)
-    data = request.get_json()
-    question = data.get('question', '')
-    resume = data.get('resume', None)
-    mode = data.get('mode', 'global')
-    history = data.get('history', [])
-    if not question:
-        return jsonify({'answer': 'No question provided.'}), 400
-    answer = gpt_engine.generate_response(question, resume_text=resume, mode=mode, history=history)
-    return jsonify({'answer': answer})
+                if event == 'done':
+                    services.cache_answer(scope, params['question'], payload)
+                    services.remember_turn(params, payload)
+                yield sse_event(event, {'answer': payload})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+def parse_batch_request():
+    """Read an /ask_batch request (JSON, or multipart with a resume file).
+
+    Returns (params, None) on success or (None, error_response).
+    """
+    multipart = bool(request.content_type and request.content_type.startswith('multipart/form-data'))
+    data = request.form if multipart else (request.get_json(silent=True) or {})
+    questions, error = batch_questions(data.getlist('questions') if multipart else (data.get('questions') or []),
+                                       multipart)
+    if error:
+        return None, error_response(error)
+    email = data.get('email')
+    if not authenticate(email, data.get('password')):
+        return None, (jsonify({'success': False, 'message': 'Invalid credentials'}), 401)
+    # Parse the resume once; every question shares the entry (text, keywords, BM25 index)
+    entry, error = services.batch_resume(request.files.get('resume') if multipart else None,
+                                         None if multipart else data.get('resume', None),
+                                         data.get('resume_id', None))
+    if error:
+        return None, error_response(error)
+    mode, error = batch_mode(data, entry)
+    if error:
+        return None, error_response(error)
+    return {
+        'email': email,
+        'questions': questions,
+        'mode': mode,
+        'entry': entry,
+    }, None
+
+
+@app.route('/ask_batch', methods=['POST'])
+def ask_batch():
+    # One resume, many questions: answers stream back as Server-Sent Events in completion order
+    batch, error = parse_batch_request()
+    if error:
+        return error
+    questions, entry = batch['questions'], batch['entry']
+    # Charge the whole batch up front in one atomic update, or nothing at all
+    credits = use_credit(batch['email'], amount=len(questions))
+    if credits is None:
+        return jsonify({'success': False, 'message': 'Not enough credits for this batch',
+                        'required': len(questions)}), 403
+
+    def answer(question):
+        return answer_question(batch_params(batch['email'], question, batch['mode'], entry))
+
+    def events():
+        # Credits are only kept for answers delivered without an error; the rest are refunded,
+        # including questions left unsent when the client disconnects mid-stream
+        charge = BatchCharge(len(questions))
+        try:
+            yield sse_event('batch', {
+                'count': len(questions),
+                'credits': credits,
+                'resume_id': entry.resume_id if entry else None,
+            })
+            with stage('ask_batch_total'):
+                futures = {batch_pool.submit(answer, q): i for i, q in enumerate(questions)}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception:
+                        log.exception("Batch question failed")
+                        result = ERROR_ANSWER
+                    charge.record(result)
+                    yield sse_event('answer', {'index': i, 'question': questions[i], 'answer': result})
+            refunded = charge.owed
+            balance = refund_credits(batch['email'], refunded) if refunded else credits
+            charge.settled = True
+            yield sse_event('done', {'count': len(questions), 'refunded': refunded, 'credits': balance})
+        finally:
+            if charge.owed:
+                refund_credits(batch['email'], charge.owed)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers=SSE_HEADERS)
 
 
 @app.route('/', defaults={'path': ''})
@@ -261,5 +444,5 @@ def serve_frontend(path: str):
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     host = os.environ.get('HOST', '0.0.0.0')
-    app.run(host=host, port=port, debug=False)
+    create_app().run(host=host, port=port, debug=False)
     
\ No newline at end of file
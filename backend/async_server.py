@@ -0,0 +1,361 @@
+# Asyncio serving mode: same API as api_server (auth, credits, /ask, /ask/stream, /ask_batch,
+# sessions, /health, /metrics), but every request is a coroutine, so one process can keep
+# hundreds of questions in flight while waiting on OpenAI and MongoDB. It serves the API only;
+# the frontend build is served by api_server. Run with:  python async_server.py  (or hypercorn async_server:app)
+import asyncio
+import logging
+import os
+
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from env_loader import robust_load_dotenv
+import metrics
+
+log = logging.getLogger(__name__)
+robust_load_dotenv()
+from gpt_engine import AsyncGPTEngine, ERROR_ANSWER
+from single_flight import AsyncSingleFlight, flight_key
+from upload_store import UploadTooLarge
+from server_common import (
+    ASK_BATCH_WORKERS, MAX_UPLOAD_BYTES, NO_CREDITS_ANSWER, SINGLE_FLIGHT_ENABLED, SSE_HEADERS,
+    BatchCharge, Services, ask_body, batch_mode, batch_params, batch_questions, engine_kwargs, sse_event,
+    upload_too_large_body,
+)
+
+MONGO_URI = os.environ.get('MONGO_URI', 'YOUR_MONGODB_ATLAS_CONNECTION_STRING')
+
+# Bounds CPU-bound work (password hashing, PDF parsing) pushed to worker threads
+CPU_CONCURRENCY = int(os.environ.get('CPU_CONCURRENCY', os.cpu_count() or 4))
+_cpu_semaphore = asyncio.Semaphore(CPU_CONCURRENCY)
+
+app = cors(Quart(__name__))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+# Batch questions answered concurrently across all /ask_batch requests
+_batch_semaphore = asyncio.Semaphore(ASK_BATCH_WORKERS)
+# Built when serving starts, not at import: resume_parser's spawned PDF workers re-import this
+# module when it is run as a script, and must not open clients or caches of their own
+client = None
+users_col = None
+services = None
+gpt_engine = None
+inflight = None
+
+
+@app.before_serving
+async def open_clients():
+    global client, users_col, services, gpt_engine, inflight
+    metrics.setup_logging()
+    client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)))
+    users_col = client['ai_assistant']['users']
+    gpt_engine = AsyncGPTEngine()
+    inflight = AsyncSingleFlight()
+    services = Services()
+    services.register_collectors(gpt_engine, inflight)
+
+
+async def run_cpu(func, *args):
+    async with _cpu_semaphore:
+        return await asyncio.to_thread(func, *args)
+
+
+async def get_user(email):
+    return await users_col.find_one({'email': email})
+
+
+async def authenticate(email, password):
+    if not email or not password:
+        return False
+    if services.auth_cache.check(email, password):
+        return True
+    user = await users_col.find_one({'email': email}, {'password': True})
+    if not user:
+        return False
+    if await run_cpu(check_password_hash, user['password'], password):
+        services.auth_cache.remember(email, password)
+        return True
+    return False
+
+
+async def get_credits(email):
+    user = await users_col.find_one({'email': email}, {'credits': True})
+    return (user or {}).get('credits', 0)
+
+
+async def use_credit(email, amount=1):
+    # Atomic check-and-decrement; new balance, or None if too few credits were left
+    user = await users_col.find_one_and_update(
+        {'email': email, 'credits': {'$gte': amount}},
+        {'$inc': {'credits': -amount}},
+        projection={'credits': True},
+        return_document=ReturnDocument.AFTER,
+    )
+    return None if not user else user.get('credits', 0)
+
+
+async def refund_credits(email, amount):
+    # Give back credits charged for answers that were never delivered; returns the new balance
+    user = await users_col.find_one_and_update(
+        {'email': email},
+        {'$inc': {'credits': amount}},
+        projection={'credits': True},
+        return_document=ReturnDocument.AFTER,
+    )
+    return (user or {}).get('credits', 0)
+
+
+async def register_resume(resume_file):
+    return await run_cpu(services.register_resume, resume_file)
+
+
+def error_response(error):
+    body, status = error
+    return jsonify(body), status
+
+
+async def answer_question(params):
+    scope = services.cache_scope(params)
+    answer = services.cached_answer(params, scope)
+    if answer is not None:
+        return answer
+
+    async def generate():
+        answer = await gpt_engine.generate_response(params['question'], **engine_kwargs(params))
+        services.cache_answer(scope, params['question'], answer)
+        return answer
+
+    if not SINGLE_FLIGHT_ENABLED:
+        return await generate()
+    key = flight_key(params['question'], params['mode'], params['resume_id'], params['resume_text'], params['history'])
+    answer, _ = await inflight.do(key, generate)
+    return answer
+
+
+@app.errorhandler(413)
+@app.errorhandler(UploadTooLarge)
+async def upload_too_large(e):
+    return jsonify(upload_too_large_body()), 413
+
+
+@app.get('/metrics')
+async def metrics_route():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/listen', methods=['POST'])
+async def listen():
+    data = await request.get_json(silent=True) or {}
+    return jsonify({'status': 'listening', 'received': data})
+
+
+@app.get('/health')
+async def health():
+    return jsonify(services.health(gpt_engine, inflight))
+
+
+@app.route('/signup', methods=['POST'])
+async def signup():
+    data = await request.get_json()
+    email = data.get('email')
+    password = data.get('password')
+    if not email or not password:
+        return jsonify({'success': False, 'message': 'Email and password required'}), 400
+    if await get_user(email):
+        return jsonify({'success': False, 'message': 'User already exists'}), 409
+    hashed = await run_cpu(generate_password_hash, password)
+    await users_col.insert_one({'email': email, 'password': hashed, 'credits': 10})
+    return jsonify({'success': True, 'message': 'User created'})
+
+
+@app.route('/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    if await authenticate(data.get('email'), data.get('password')):
+        return jsonify({'success': True, 'message': 'Login successful'})
+    return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+
+
+@app.route('/logout', methods=['POST'])
+async def logout():
+    data = await request.get_json(silent=True) or {}
+    if data.get('email'):
+        services.auth_cache.forget(data['email'])
+    return jsonify({'success': True, 'message': 'Logged out'})
+
+
+@app.route('/get_credits', methods=['POST'])
+async def get_credits_route():
+    data = await request.get_json()
+    email = data.get('email')
+    if await authenticate(email, data.get('password')):
+        return jsonify({'success': True, 'credits': await get_credits(email)})
+    return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+
+
+@app.route('/use_credit', methods=['POST'])
+async def use_credit_route():
+    data = await request.get_json()
+    email = data.get('email')
+    if not await authenticate(email, data.get('password')):
+        return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+    credits = await use_credit(email)
+    if credits is None:
+        return jsonify({'success': False, 'message': 'No credits left'}), 403
+    return jsonify({'success': True, 'credits': credits})
+
+
+@app.route('/upload_resume', methods=['POST'])
+async def upload_resume():
+    files = await request.files
+    resume_file = files.get('resume')
+    if not resume_file:
+        return jsonify({'success': False, 'message': 'No resume file provided'}), 400
+    entry, cached = await register_resume(resume_file)
+    return jsonify({'success': True, 'resume_id': entry.resume_id, 'resume_text': entry.text, 'cached': cached})
+
+
+async def parse_ask_request():
+    """Read an /ask body (multipart or JSON); see Services.ask_params.
+
+    Returns (params, None) on success or (None, error_response).
+    """
+    multipart = bool(request.content_type and request.content_type.startswith('multipart/form-data'))
+    data = await request.form if multipart else (await request.get_json(silent=True) or {})
+    email = data.get('email', None)
+    if email and await get_credits(email) <= 0:
+        return None, (jsonify({'answer': NO_CREDITS_ANSWER}), 403)
+    resume_file = (await request.files).get('resume') if multipart else None
+    entry = (await register_resume(resume_file))[0] if resume_file else None
+    params, error = services.ask_params(data, multipart, email, entry)
+    if error:
+        return None, error_response(error)
+    return params, None
+
+
+@app.route('/session/clear', methods=['POST'])
+async def clear_session():
+    data = await request.get_json(silent=True) or {}
+    services.session_store.clear(data.get('session_id'))
+    return jsonify({'success': True})
+
+
+@app.route('/ask', methods=['POST'])
+async def ask():
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return await ask_stream()
+    with metrics.stage('ask_total'):
+        params, error = await parse_ask_request()
+        if error:
+            return error
+        answer = await answer_question(params)
+    services.remember_turn(params, answer)
+    return jsonify(ask_body(params, answer))
+
+
+@app.route('/ask/stream', methods=['POST'])
+async def ask_stream():
+    # Same inputs as /ask, answered as Server-Sent Events while the model is generating
+    params, error = await parse_ask_request()
+    if error:
+        return error
+
+    async def events():
+        if params['resume_id']:
+            yield sse_event('resume', {'resume_id': params['resume_id']})
+        if params['session_id']:
+            yield sse_event('session', {'session_id': params['session_id']})
+        scope = services.cache_scope(params)
+        cached = services.cached_answer(params, scope)
+        if cached is not None:
+            services.remember_turn(params, cached)
+            yield sse_event('token', {'text': cached})
+            yield sse_event('done', {'answer': cached})
+            return
+        async for event, payload in gpt_engine.stream_response(params['question'], **engine_kwargs(params)):
+            if event == 'token':
+                yield sse_event('token', {'text': payload})
+            elif event == 'reset':
+                yield sse_event('reset', {})
+            else:
+                if event == 'done':
+                    services.cache_answer(scope, params['question'], payload)
+                    services.remember_turn(params, payload)
+                yield sse_event(event, {'answer': payload})
+
+    return Response(events(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.route('/ask_batch', methods=['POST'])
+async def ask_batch():
+    # One resume, many questions: answers stream back as Server-Sent Events in completion order
+    multipart = bool(request.content_type and request.content_type.startswith('multipart/form-data'))
+    data = await request.form if multipart else (await request.get_json(silent=True) or {})
+    questions, error = batch_questions(data.getlist('questions') if multipart else (data.get('questions') or []),
+                                       multipart)
+    if error:
+        return error_response(error)
+    email = data.get('email')
+    if not await authenticate(email, data.get('password')):
+        return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
+    entry, error = await run_cpu(services.batch_resume, (await request.files).get('resume') if multipart else None,
+                                 None if multipart else data.get('resume', None), data.get('resume_id', None))
+    if error:
+        return error_response(error)
+    mode, error = batch_mode(data, entry)
+    if error:
+        return error_response(error)
+    # Charge the whole batch up front in one atomic update, or nothing at all
+    credits = await use_credit(email, amount=len(questions))
+    if credits is None:
+        return jsonify({'success': False, 'message': 'Not enough credits for this batch',
+                        'required': len(questions)}), 403
+
+    async def answer(i, question):
+        async with _batch_semaphore:
+            try:
+                result = await answer_question(batch_params(email, question, mode, entry))
+            except Exception:
+                log.exception("Batch question failed")
+                result = ERROR_ANSWER
+        return i, result
+
+    async def events():
+        # Credits are only kept for answers delivered without an error; the rest are refunded,
+        # including questions left unsent when the client disconnects mid-stream
+        charge = BatchCharge(len(questions))
+        try:
+            yield sse_event('batch', {'count': len(questions), 'credits': credits,
+                                      'resume_id': entry.resume_id if entry else None})
+            with metrics.stage('ask_batch_total'):
+                for next_done in asyncio.as_completed([answer(i, q) for i, q in enumerate(questions)]):
+                    i, result = await next_done
+                    charge.record(result)
+                    yield sse_event('answer', {'index': i, 'question': questions[i], 'answer': result})
+            refunded = charge.owed
+            balance = await refund_credits(email, refunded) if refunded else credits
+            charge.settled = True
+            yield sse_event('done', {'count': len(questions), 'refunded': refunded, 'credits': balance})
+        finally:
+            if charge.owed:
+                await refund_credits(email, charge.owed)
+
+    return Response(events(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.after_serving
+async def close_clients():
+    await gpt_engine.aclose()
+    client.close()
+
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"{os.environ.get('HOST', '0.0.0.0')}:{int(os.environ.get('PORT', 5000))}"]
+    config.backlog = int(os.environ.get('BACKLOG', 1024))
+    asyncio.run(serve(app, config))
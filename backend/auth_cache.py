@@ -0,0 +1,57 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class AuthCache:
+    """Remembers recently verified (email, password) pairs so credit calls skip PBKDF2.
+
+    Only an HMAC of the password under a per-process random key is kept, never
+    the password itself, and entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, ttl=300, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()  # email -> (digest, verified_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _digest(self, email, password):
+        return hmac.new(self._key, f"{email}\0{password}".encode('utf-8'), hashlib.sha256).digest()
+
+    def check(self, email, password):
+        if not self.ttl:
+            return False
+        digest = self._digest(email, password)
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl and hmac.compare_digest(entry[0], digest):
+                self._entries.move_to_end(email)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def remember(self, email, password):
+        if not self.ttl:
+            return
+        digest = self._digest(email, password)
+        with self._lock:
+            self._entries[email] = (digest, time.monotonic())
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, email):
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,75 @@
+"""Micro-benchmark: precompiled AnswerFilter vs. the old per-request Smart-mode checks.
+
+Run from backend/:  python bench/bench_answer_filter.py [--number N]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_filter import FORBIDDEN_PHRASES, answer_filter, keywords  # noqa: E402
+
+RESUME = (
+    "Jane Doe - Senior Software Engineer\n"
+    "Experience: Built Kafka streaming pipelines at Acme Corp processing 2B events per day. "
+    "Led migration of monolith services to Kubernetes, cutting deploy time by 70 percent. "
+    "Designed PostgreSQL sharding strategy and Redis caching layer for checkout service.\n"
+    "Skills: Python, Go, Terraform, AWS, GCP, gRPC, Prometheus, Grafana.\n"
+    "Education: BSc Computer Science, State University.\n"
+) * 8
+
+ANSWERS = [
+    "At Acme I built the Kafka pipelines that process two billion events a day, and I led our move to Kubernetes.",
+    "I would approach this by focusing on communication and teamwork, making sure everyone is aligned on goals.",
+    "For example, when our checkout service slowed down I designed a Redis caching layer that fixed it.",
+    "My strongest skill is Python; I used it with Terraform and gRPC to automate infrastructure on AWS and GCP.",
+]
+
+
+def legacy_check(answer, resume_text):
+    # The checks generate_response used to run on every Smart-mode answer
+    forbidden = [
+        "template", "sample", "example", "generic", "fallback", "instructional", "structured", "suggested", "possible answer", "response:",
+        "this is a template", "here is a template", "here is an example", "here is a sample", "sample response", "for example", "for instance"
+    ]
+    if any(f in answer.lower() for f in forbidden):
+        return "blocked"
+    resume_keywords = set(w.lower() for w in re.findall(r"[A-Za-z]{4,}", resume_text))
+    answer_words = set(w.lower() for w in re.findall(r"[A-Za-z]{4,}", answer))
+    if len(resume_keywords & answer_words) == 0:
+        return "no_overlap"
+    return "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help='iterations per answer')
+    args = parser.parse_args()
+
+    # Cached keyword set, as kept on ResumeEntry
+    resume_keywords = keywords(RESUME)
+    assert len(FORBIDDEN_PHRASES) > 0
+    for answer in ANSWERS:
+        assert legacy_check(answer, RESUME) == answer_filter.classify(answer, resume_keywords), answer
+
+    def run_legacy():
+        for answer in ANSWERS:
+            legacy_check(answer, RESUME)
+
+    def run_filter():
+        for answer in ANSWERS:
+            answer_filter.classify(answer, resume_keywords)
+
+    calls = args.number * len(ANSWERS)
+    legacy = min(timeit.repeat(run_legacy, number=args.number, repeat=3))
+    new = min(timeit.repeat(run_filter, number=args.number, repeat=3))
+    print(f"legacy checks:  {legacy / calls * 1e6:8.2f} us/answer")
+    print(f"AnswerFilter:   {new / calls * 1e6:8.2f} us/answer")
+    print(f"speedup:        {legacy / new:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
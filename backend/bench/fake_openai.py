@@ -0,0 +1,169 @@
+"""Local stand-in for the OpenAI chat-completions API, for offline benchmarks.
+
+Serves POST /v1/chat/completions (plain and stream=true) with a fixed answer,
+a configurable time to first token and a configurable token rate. Point the
+backend at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Run standalone:  python bench/fake_openai.py --port 8099 --latency 0.3 --tokens-per-second 80
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = (
+    "At Acme I built Kafka pipelines processing two billion events a day, and I led our Kubernetes "
+    "migration, which cut deploy time by seventy percent while keeping checkout latency flat."
+)
+
+
+class FakeOpenAIConfig:
+    def __init__(self, latency=0.3, tokens_per_second=80.0, answer=DEFAULT_ANSWER, rate_limit_every=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.answer = answer
+        # Return HTTP 429 for every Nth request (0 = never), to exercise retry paths
+        self.rate_limit_every = rate_limit_every
+        self.requests = 0
+        self.lock = threading.Lock()
+        self._seen_prefixes = set()
+
+    def cached_tokens(self, messages):
+        # Mimic upstream prompt caching: a repeated leading system message of 1024+ tokens is "cached"
+        if not messages:
+            return 0
+        prefix = messages[0].get('content') or ''
+        tokens = len(prefix) // 4
+        with self.lock:
+            seen = prefix in self._seen_prefixes
+            self._seen_prefixes.add(prefix)
+        return tokens - tokens % 128 if seen and tokens >= 1024 else 0
+
+
+def _tokens(text):
+    # Whitespace-preserving word pieces, roughly one token each
+    pieces = []
+    for i, word in enumerate(text.split(' ')):
+        pieces.append(word if i == 0 else ' ' + word)
+    return pieces
+
+
+def _prompt_tokens(messages):
+    return sum(len(m.get('content') or '') for m in messages) // 4
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+        config = self.config
+        with config.lock:
+            config.requests += 1
+            limited = config.rate_limit_every and config.requests % config.rate_limit_every == 0
+        if limited:
+            self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                            headers={'retry-after-ms': '50'})
+            return
+        tokens = _tokens(config.answer)[:max(1, int(body.get('max_tokens') or 512))]
+        usage = {
+            'prompt_tokens': _prompt_tokens(body.get('messages', [])),
+            'completion_tokens': len(tokens),
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        usage['prompt_tokens_details'] = {'cached_tokens': config.cached_tokens(body.get('messages', []))}
+        model = body.get('model', 'gpt-4o')
+        time.sleep(config.latency)
+        if body.get('stream'):
+            self._stream(model, tokens, usage, (body.get('stream_options') or {}).get('include_usage'))
+            return
+        if config.tokens_per_second:
+            time.sleep(len(tokens) / config.tokens_per_second)
+        self._send_json(200, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                'finish_reason': 'stop',
+            }],
+            'usage': usage,
+        })
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, model, tokens, usage, include_usage):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        delay = 1.0 / self.config.tokens_per_second if self.config.tokens_per_second else 0
+
+        def chunk(choices, extra=None):
+            payload = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                       'model': model, 'choices': choices}
+            payload.update(extra or {})
+            self.wfile.write(b'data: ' + json.dumps(payload).encode('utf-8') + b'\n\n')
+            self.wfile.flush()
+
+        for token in tokens:
+            chunk([{'index': 0, 'delta': {'content': token}, 'finish_reason': None}])
+            if delay:
+                time.sleep(delay)
+        chunk([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+        if include_usage:
+            chunk([], {'usage': usage})
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+
+
+def make_server(host='127.0.0.1', port=0, config=None):
+    handler = type('ConfiguredFakeOpenAIHandler', (FakeOpenAIHandler,), {'config': config or FakeOpenAIConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(config=None, host='127.0.0.1', port=0):
+    """Start the fake API on a background thread; returns (server, base_url)."""
+    server = make_server(host, port, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake OpenAI chat-completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.3, help='seconds before the first token')
+    parser.add_argument('--tokens-per-second', type=float, default=80.0, help='0 sends all tokens at once')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='answer every Nth request with HTTP 429')
+    args = parser.parse_args()
+    config = FakeOpenAIConfig(args.latency, args.tokens_per_second, rate_limit_every=args.rate_limit_every)
+    server = make_server(args.host, args.port, config)
+    print(f"Fake OpenAI listening on http://{args.host}:{server.server_address[1]}/v1")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
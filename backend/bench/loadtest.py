@@ -0,0 +1,236 @@
+"""Offline load test for the backend: fake OpenAI, in-memory Mongo, no network.
+
+Starts bench/fake_openai.py on a background thread, points the backend at it
+with OPENAI_BASE_URL, swaps MongoDB for mongomock (MONGO_URI=mongomock://),
+serves api_server in-process and drives the chosen scenarios at a fixed
+concurrency. Prints p50/p95/p99 latency and throughput per scenario plus the
+mean time of each /ask stage taken from /metrics. Needs requirements-dev.txt
+(mongomock) on top of requirements.txt.
+
+    python bench/loadtest.py --concurrency 32 --requests 400
+    python bench/loadtest.py --scenarios ask_json,use_credit --json > before.json
+    python bench/loadtest.py --target http://127.0.0.1:5000   # an already running server
+
+--max-p95 SCENARIO=SECONDS makes the run exit non-zero when a scenario is slower,
+so it can gate CI.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_openai import FakeOpenAIConfig, start_in_thread
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'bench-password'
+QUESTIONS = [
+    "Tell me about yourself",
+    "What is the difference between a process and a thread?",
+    "Describe a project where you used Kafka",
+    "How do you handle disagreements in a team?",
+    "Explain how a hash map works",
+    "What did you do at Acme?",
+    "Why do you want to work here?",
+    "Walk me through your Kubernetes migration",
+]
+RESUME = (
+    "Jane Doe\nSenior Backend Engineer\n\nExperience\n"
+    "Acme Corp - Built Kafka pipelines processing two billion events a day. "
+    "Led the Kubernetes migration, cutting deploy time by seventy percent.\n\n"
+    "Skills\nPython, Go, Kafka, Kubernetes, PostgreSQL, Redis\n\n"
+    "Education\nBSc Computer Science\n"
+)
+SCENARIOS = ('ask_json', 'ask_smart', 'use_credit', 'get_credits')
+STAGE_RE = re.compile(r'^ask_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$')
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def start_local_server(args):
+    fake_config = FakeOpenAIConfig(args.openai_latency, args.openai_tps)
+    _, base_url = start_in_thread(fake_config)
+    os.environ['OPENAI_BASE_URL'] = base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'bench')
+    os.environ['MONGO_URI'] = 'mongomock://bench'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Uploaded resumes go to a throwaway directory, not backend/uploads in the source tree
+    os.environ['UPLOAD_DIR'] = tempfile.mkdtemp(prefix='loadtest-uploads-')
+    if not args.answer_cache:
+        os.environ['ANSWER_CACHE'] = '0'
+
+    from werkzeug.serving import make_server
+    import api_server
+
+    server = make_server('127.0.0.1', 0, api_server.create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return api_server, f"http://127.0.0.1:{server.server_port}"
+
+
+def seed_user(api_module, base, credits):
+    if api_module is not None:
+        api_module.create_user(EMAIL, PASSWORD)
+        api_module.users_collection().update_one({'email': EMAIL}, {'$set': {'credits': credits}})
+        return
+    # Remote target: the account must exist; signup is a no-op if it already does
+    requests.post(f"{base}/signup", json={'email': EMAIL, 'password': PASSWORD}, timeout=10)
+
+
+def make_scenario(name, base):
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    def ask_json(i):
+        return session().post(f"{base}/ask", json={
+            'question': QUESTIONS[i % len(QUESTIONS)], 'mode': 'global', 'email': EMAIL,
+        }, timeout=60)
+
+    def ask_smart(i):
+        return session().post(f"{base}/ask", data={
+            'question': QUESTIONS[i % len(QUESTIONS)], 'mode': 'resume', 'email': EMAIL,
+        }, files={'resume': ('resume.txt', RESUME.encode('utf-8'), 'text/plain')}, timeout=60)
+
+    def use_credit(i):
+        return session().post(f"{base}/use_credit", json={'email': EMAIL, 'password': PASSWORD}, timeout=30)
+
+    def get_credits(i):
+        return session().post(f"{base}/get_credits", json={'email': EMAIL, 'password': PASSWORD}, timeout=30)
+
+    return locals()[name]
+
+
+def run_scenario(name, base, concurrency, total):
+    call = make_scenario(name, base)
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ok = call(i).status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - wall_start
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': errors,
+        'concurrency': concurrency,
+        'rps': round(total / wall, 2) if wall else 0.0,
+        'p50': round(percentile(latencies, 50), 4),
+        'p95': round(percentile(latencies, 95), 4),
+        'p99': round(percentile(latencies, 99), 4),
+    }
+
+
+def scrape_stages(base):
+    try:
+        text = requests.get(f"{base}/metrics", timeout=10).text
+    except requests.RequestException:
+        return {}
+    sums, counts = {}, {}
+    for line in text.splitlines():
+        match = STAGE_RE.match(line)
+        if match:
+            kind, stage_name, value = match.groups()
+            (sums if kind == 'sum' else counts)[stage_name] = float(value)
+    return {name: {'count': int(counts[name]), 'mean': round(sums.get(name, 0.0) / counts[name], 4)}
+            for name in sorted(counts) if counts[name]}
+
+
+def parse_thresholds(values):
+    thresholds = {}
+    for value in values or []:
+        name, _, seconds = value.partition('=')
+        thresholds[name] = float(seconds)
+    return thresholds
+
+
+def print_report(report):
+    print(f"{'scenario':<14}{'reqs':>7}{'errors':>8}{'rps':>10}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, row in report['scenarios'].items():
+        print(f"{name:<14}{row['requests']:>7}{row['errors']:>8}{row['rps']:>10.1f}"
+              f"{row['p50']:>9.3f}{row['p95']:>9.3f}{row['p99']:>9.3f}")
+    if report['stages']:
+        print("\nstage breakdown (server side, seconds)")
+        for name, row in report['stages'].items():
+            print(f"  {name:<22}{row['count']:>8}  mean {row['mean']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline load test for the AI-Assis backend')
+    parser.add_argument('--target', help='base URL of a running server; default starts one in-process')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--openai-latency', type=float, default=0.3, help='fake time to first token (s)')
+    parser.add_argument('--openai-tps', type=float, default=80.0, help='fake tokens per second')
+    parser.add_argument('--answer-cache', action='store_true', help='leave the answer cache enabled')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--max-p95', action='append', metavar='SCENARIO=SECONDS')
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    api_module = None
+    if args.target:
+        base = args.target.rstrip('/')
+    else:
+        api_module, base = start_local_server(args)
+    seed_user(api_module, base, credits=10 ** 9)
+
+    report = {'target': base, 'scenarios': {}, 'stages': {}}
+    for name in scenarios:
+        report['scenarios'][name] = run_scenario(name, base, args.concurrency, args.requests)
+    report['stages'] = scrape_stages(base)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    failed = []
+    for name, limit in parse_thresholds(args.max_p95).items():
+        row = report['scenarios'].get(name)
+        if row is not None and row['p95'] > limit:
+            failed.append(f"{name} p95 {row['p95']:.3f}s > {limit:.3f}s")
+    for line in failed:
+        print(f"FAIL: {line}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
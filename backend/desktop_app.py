@@ -1,14 +1,32 @@
+# Minimal PyWebView app: only runs Flask backend and launches the UI
+import time
 
+_PROCESS_START = time.perf_counter()
 
-# Minimal PyWebView app: only runs Flask backend and launches the UI
+import json
+import logging
+import multiprocessing
+import socket
 import threading
-import time
-import webview
+import urllib.request
 import os
 import sys
-from api_server import app
+
+log = logging.getLogger('desktop_app')
+
+# Seconds to wait for the backend to answer /health before opening the window anyway
+STARTUP_TIMEOUT = float(os.environ.get('STARTUP_TIMEOUT', 20))
+startup_times = {}  # phase -> seconds since process start, exported as startup_* metrics
+
+
+def mark(phase):
+    startup_times[phase] = round(time.perf_counter() - _PROCESS_START, 4)
+    log.info("startup: %s after %.0f ms", phase, startup_times[phase] * 1000)
+
 
 def expose_quit_api():
+    import webview
+
     def quit():
         try:
             webview.windows[0].destroy()
@@ -24,16 +42,90 @@ def expose_quit_api():
                 quit()
         return Api()
 
-def run_flask():
-    host = os.environ.get('HOST', '127.0.0.1')
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host=host, port=port, debug=False, use_reloader=False)
+def port_available(host, port):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as probe:
+        if os.name != 'nt':
+            # Match werkzeug, so a port in TIME_WAIT still counts as free (on Windows this would allow double binds)
+            probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            probe.bind((host, port))
+        except OSError:
+            return False
+    return True
+
+def make_backend_server(app, host, port):
+    from werkzeug.serving import make_server
+    # werkzeug prints "Address already in use" and calls sys.exit(1) instead of raising OSError,
+    # so probe the preferred port first; SystemExit covers losing a race for it after the probe
+    if not port:
+        return make_server(host, 0, app, threaded=True)
+    if port_available(host, port):
+        try:
+            return make_server(host, port, app, threaded=True)
+        except SystemExit:
+            pass
+    # Preferred port is taken (another copy, or some other app): let the OS pick a free one
+    log.warning("Port %d is in use, using an ephemeral port", port)
+    return make_server(host, 0, app, threaded=True)
+
+def run_flask(ready):
+    try:
+        from api_server import create_app
+        import metrics
+        app = create_app()
+        mark('backend_imported')
+        metrics.register_collector('startup', lambda: dict(startup_times))
+        host = os.environ.get('HOST', '127.0.0.1')
+        server = make_backend_server(app, host, int(os.environ.get('PORT', 5000)))
+        ready['port'] = server.server_port
+    finally:
+        ready['event'].set()
+    server.serve_forever()
+
+def wait_until_healthy(port, timeout=STARTUP_TIMEOUT):
+    # Readiness handshake: poll /health until the backend answers instead of sleeping a fixed time
+    deadline = time.monotonic() + timeout
+    url = f'http://127.0.0.1:{port}/health'
+    delay = 0.01
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 0.2)
+    return False
+
+def record_startup():
+    # STARTUP_LOG=path appends one JSON line per launch, for tracking cold starts of the bundled EXE
+    path = os.environ.get('STARTUP_LOG')
+    if not path:
+        return
+    try:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'time': time.time(), 'frozen': getattr(sys, 'frozen', False), **startup_times}) + '\n')
+    except OSError as e:
+        log.warning("Could not write startup log: %s", e)
 
 def main():
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
+    ready = {'event': threading.Event(), 'port': None}
+    flask_thread = threading.Thread(target=run_flask, args=(ready,), daemon=True)
     flask_thread.start()
-    time.sleep(1.5)
-    url = 'http://127.0.0.1:5000/'
+    # Imported while the backend thread loads, rather than before it starts
+    import webview
+    ready['event'].wait(STARTUP_TIMEOUT)
+    if ready['port'] is None:
+        log.error("Backend failed to start")
+        sys.exit(1)
+    port = ready['port']
+    if wait_until_healthy(port):
+        mark('backend_ready')
+    else:
+        log.warning("Backend on port %d did not pass /health within %.0f s", port, STARTUP_TIMEOUT)
+    url = f'http://127.0.0.1:{port}/'
     window = webview.create_window(
         'System Monitor',
         url,
@@ -50,8 +142,18 @@ def main():
         x=100,
         y=100
     )
+
+    def on_loaded():
+        mark('window_loaded')
+        record_startup()
+
+    events = getattr(window, 'events', None)
+    if events is not None and hasattr(events, 'loaded'):
+        events.loaded += on_loaded
     api = expose_quit_api()
     webview.start(api, debug=False)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # resume_parser extracts large PDFs in worker processes; required for the frozen EXE
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,23 @@
+import logging
+import pathlib
+import sys
+
+from dotenv import load_dotenv
+
+# Robust .env loading for EXE and dev
+def robust_load_dotenv():
+    # Try current working dir
+    dotenv_paths = [
+        pathlib.Path.cwd() / '.env',
+        pathlib.Path(__file__).parent / '.env'
+    ]
+    # If running in PyInstaller bundle, also try _MEIPASS
+    if hasattr(sys, '_MEIPASS'):
+        dotenv_paths.append(pathlib.Path(sys._MEIPASS) / '.env')
+    for dotenv_path in dotenv_paths:
+        if dotenv_path.exists():
+            load_dotenv(dotenv_path)
+            logging.getLogger(__name__).debug("Loaded .env from: %s", dotenv_path)
+            break
+    else:
+        logging.getLogger(__name__).warning(".env file not found in any expected location!")
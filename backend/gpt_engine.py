@@ -1,153 +1,514 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
 import re
-from openai import OpenAI
+import threading
+import time
+from collections import Counter, OrderedDict
 from dotenv import load_dotenv
 
+from answer_filter import answer_filter, keywords
+from llm_scheduler import LLMScheduler, SchedulerBusy
+from resume_index import ResumeIndex, estimate_tokens
+import metrics
+from metrics import STAGE_SECONDS, TOKEN_BUCKETS, Histogram, record_usage, stage
+
+log = logging.getLogger(__name__)
+RESUME_TOKENS_SAVED = Histogram('resume_prompt_tokens_saved', 'Estimated resume tokens left out of each Smart-mode prompt', buckets=TOKEN_BUCKETS)
+
+EMPTY_RESUME_ANSWER = "Could not extract any text from the uploaded resume. If your PDF is a scanned image, try a text-based PDF or upload a .txt file instead."
+BLOCKED_ANSWER = "[Error: The answer was blocked because it looked like a template or sample. Please rephrase your question.]"
+RATE_LIMITED_ANSWER = "[Error: Too many requests right now. Please try again in a moment.]"
+ERROR_ANSWER = "[Error: Could not generate answer.]"
+
+# Question words that say nothing about whether the resume covers the topic
+QUESTION_STOPWORDS = {
+    "what", "when", "where", "which", "your", "yours", "about", "tell", "have", "with", "that", "this",
+    "there", "they", "them", "were", "been", "from", "into", "some", "give", "explain", "talk", "please",
+    "know", "like", "think", "describe", "would", "could", "should", "does", "doing", "done", "will",
+    "much", "many", "more", "most", "very", "than", "then", "also", "just", "here", "being", "make",
+}
+
+# Questions addressed to the candidate ("why should we hire you?") are answered from the resume
+# even when none of their words appear in it
+CANDIDATE_RE = re.compile(r"\b(you|your|yours|yourself|you're|you've|you'd|you'll)\b")
+
+# Smart-mode system prompt up to the resume; shared by intro and regular questions so the
+# instructions + resume prefix stays identical across a session
+SMART_PREFIX_PROMPT = (
+    "You are an interview assistant. Answer in the user's point of view (first-person) using ONLY the facts found in the resume below. "
+    "If the resume does not cover the question, answer the question directly in the user's point of view (first-person), with a practical, specific answer. "
+    "Do NOT use a template, structure, generic example, fallback message, or any instructional text. Do NOT say 'here is a template', 'sample answer', 'example', or anything similar. Only answer as the user would, based on resume facts.\n\nResume:\n"
+)
+SMART_INTRO_PROMPT = "This question asks for an introduction: write a first-person introduction using only facts from the resume."
+SMART_QUESTION_PROMPT = "Answer this question using the resume above. Keep the answer concise, practical and specific."
+GLOBAL_PROMPT = (
+    "You are a helpful interview assistant. Provide general interview advice, tips, and guidance. "
+    "Focus on common interview questions, best practices, and general career advice. "
+    "Do not reference any specific resume or personal information unless provided in the conversation."
+)
+# Distinct prompt prefixes remembered for the prefix_repeats/prefix_new stats
+RECENT_PREFIXES = 1024
+# Shortest prompt prefix the API caches; anything shorter is never reported as cached tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+def prefix_fingerprint(messages):
+    """Short hash of the leading system message, the part upstream prompt caching can reuse."""
+    return hashlib.sha256(messages[0]["content"].encode("utf-8")).hexdigest()[:16]
+
+
+# USD per 1M (input, output) tokens, for the per-tier cost estimate; MODEL_PRICES (JSON) overrides
+DEFAULT_MODEL_PRICES = {"gpt-4o": (2.50, 10.00), "gpt-4o-mini": (0.15, 0.60)}
+MODEL_CALL_SECONDS = Histogram('llm_model_call_seconds', 'OpenAI call latency by model tier', ['tier', 'model'])
+MODEL_COST_USD = metrics.Counter('llm_model_cost_usd_total', 'Estimated OpenAI spend by model tier', ['tier', 'model'])
+
+
+def _history_turns(history):
+    if not history or not isinstance(history, list):
+        return 0
+    return sum(1 for m in history if isinstance(m, dict) and m.get("role") == "user")
+
+
+def _estimate_call_tokens(messages, max_tokens):
+    # Charged against the scheduler's token buckets up front, settled from usage afterwards
+    return sum(estimate_tokens(m.get("content") or "") for m in messages) + max_tokens
+
+
+def _pool_limits(max_connections):
+    import httpx
+    # One shared keep-alive pool per engine instead of a fresh connection per request
+    return httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+
 class GPTEngine:
     def __init__(self):
         load_dotenv()
-        api_key = os.getenv('OPENAI_API_KEY')
-        self.client = OpenAI(api_key=api_key)
+        self._api_key = os.getenv('OPENAI_API_KEY')
+        self._pool_size = int(os.getenv('OPENAI_POOL_SIZE', 32))
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._init_routing()
+
+    @property
+    def client(self):
+        # openai/httpx are imported and the pool built on first use, keeping them off the startup path
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._make_client()
+        return self._client
 
-    def generate_response(self, question, resume_text=None, mode="global", history=None):
+    def _make_client(self):
+        import httpx
+        from openai import OpenAI
+        return OpenAI(api_key=self._api_key, max_retries=0, http_client=httpx.Client(limits=_pool_limits(self._pool_size)))
+
+    def _init_routing(self):
+        # Smart mode scores question/resume relevance locally and sends exactly one request
+        # with the right prompt, instead of answering and then re-asking with general_prompt.
+        # SMART_SINGLE_PASS=0 restores the old answer-then-fallback behaviour.
+        self.smart_single_pass = os.getenv('SMART_SINGLE_PASS', '1') != '0'
+        # Only questions that are not about the candidate and whose content words score at or below
+        # SMART_RELEVANCE_THRESHOLD against the resume skip it; with the default 0, any shared word keeps it.
+        self.relevance_threshold = float(os.getenv('SMART_RELEVANCE_THRESHOLD', 0))
+        # Long resumes are cut down to the top-k BM25 sections for the question, within a token budget.
+        # RESUME_RETRIEVAL=0 always inlines the full resume.
+        self.resume_retrieval = os.getenv('RESUME_RETRIEVAL', '1') != '0'
+        self.resume_top_k = int(os.getenv('RESUME_TOP_K', 4))
+        self.resume_token_budget = int(os.getenv('RESUME_TOKEN_BUDGET', 600))
+        # Trimming makes the resume part of the prompt differ per question, so nothing about it is
+        # cacheable upstream. When instructions + the whole resume reach the API's cache minimum and
+        # fit PROMPT_CACHE_MAX_TOKENS, the resume is sent whole instead, as a prefix that every
+        # question about it reuses; longer resumes are trimmed. Cached input is billed at half price,
+        # so the default cap is about twice the trimmed budget, where the two cost the same.
+        # PROMPT_CACHE_FULL_RESUME=0 always trims.
+        self.prompt_cache_full_resume = os.getenv('PROMPT_CACHE_FULL_RESUME', '1') != '0'
+        self.prompt_cache_min_tokens = int(os.getenv('PROMPT_CACHE_MIN_TOKENS', PROMPT_CACHE_MIN_TOKENS))
+        self.prompt_cache_max_tokens = int(os.getenv(
+            'PROMPT_CACHE_MAX_TOKENS', estimate_tokens(SMART_PREFIX_PROMPT) + 2 * self.resume_token_budget))
+        # Model tier per question: short Global questions with little history and questions the
+        # resume does not cover go to MODEL_FAST with a smaller max_tokens; intro questions and
+        # resume-grounded answers stay on MODEL_FULL. MODEL_ROUTING=0 sends everything to MODEL_FULL.
+        self.model_routing = os.getenv('MODEL_ROUTING', '1') != '0'
+        self.model_full = os.getenv('MODEL_FULL', 'gpt-4o')
+        self.model_fast = os.getenv('MODEL_FAST', 'gpt-4o-mini')
+        self.fast_max_words = int(os.getenv('MODEL_FAST_MAX_WORDS', 12))
+        self.fast_max_history = int(os.getenv('MODEL_FAST_MAX_HISTORY', 2))
+        self.fast_max_tokens = int(os.getenv('MODEL_FAST_MAX_TOKENS', 256))
+        self.model_prices = dict(DEFAULT_MODEL_PRICES, **json.loads(os.getenv('MODEL_PRICES', '{}')))
+        # Rate limits (0 = unlimited), fair queueing across users and retries for every OpenAI call
+        self.scheduler = LLMScheduler(
+            max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', self._pool_size)),
+            global_rpm=int(os.getenv('LLM_GLOBAL_RPM', 0)),
+            global_tpm=int(os.getenv('LLM_GLOBAL_TPM', 0)),
+            user_rpm=int(os.getenv('LLM_USER_RPM', 0)),
+            user_tpm=int(os.getenv('LLM_USER_TPM', 0)),
+            max_wait=float(os.getenv('LLM_MAX_QUEUE_WAIT', 60)),
+            max_retries=int(os.getenv('LLM_MAX_RETRIES', 3)),
+        )
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+        self._recent_prefixes = OrderedDict()
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def generate_response(self, question, resume_text=None, mode="global", history=None, resume_keywords=None, resume_index=None, user=None):
         if not question.strip():
             return "No question provided."
         
-        import sys
-        print(f"[DEBUG] generate_response called with mode={mode}, resume_text_len={len(resume_text) if resume_text else 0}")
-        sys.stdout.flush()
+        log.debug("generate_response called with mode=%s, resume_text_len=%d", mode, len(resume_text) if resume_text else 0)
         
         is_intro = self._is_intro_question(question)
         
         if mode == "resume":
             if not resume_text or not resume_text.strip():
-                return ("Could not extract any text from the uploaded resume. If your PDF is a scanned image, try a text-based PDF or upload a .txt file instead.")
-            # Smart mode: Use resume context if possible, else give a direct answer. STRONG anti-template instructions.
-            # ...existing code...
-            # Smart mode: Use resume context if possible, else give a direct answer. STRONG anti-template instructions.
-            if is_intro:
-                system_prompt = (
-                    "You are an interview assistant. Write a first-person introduction using ONLY the facts found in the resume below. "
-                    "If the resume does not contain enough information, answer the question directly in the user's point of view (first-person), with a practical, specific answer. "
-                    "Do NOT use a template, structure, generic example, fallback message, or any instructional text. Do NOT say 'here is a template', 'sample answer', 'example', or anything similar. Only answer as the user would, based on resume facts.\n\nResume:\n" + resume_text
-                )
-            else:
-                system_prompt = (
-                    "You are an interview assistant. Answer ONLY using the resume below. If the resume does not cover the question, answer the question directly in the user's point of view (first-person), with a concise, practical, specific answer. "
-                    "Do NOT use a template, structure, generic example, fallback message, or any instructional text. Do NOT say 'here is a template', 'sample answer', 'example', or anything similar. Only answer as the user would, based on resume facts.\n\nResume:\n" + resume_text
-                )
-            print("[DEBUG] SMART MODE PROMPT SENT TO OPENAI:\n", system_prompt[:1000])
-            sys.stdout.flush()
-            messages = [
-                {"role": "system", "content": system_prompt}
-            ]
-            if history and isinstance(history, list) and len(history) > 0:
-                messages += history
-            messages.append({"role": "user", "content": question})
-        else:
-            # Global mode: answer purely general questions
-            system_prompt = (
-                "You are a helpful interview assistant. Provide general interview advice, tips, and guidance. "
-                "Focus on common interview questions, best practices, and general career advice. "
-                "Do not reference any specific resume or personal information unless provided in the conversation."
-            )
-            print(f"[DEBUG] GLOBAL MODE PROMPT SENT TO OPENAI:\n{system_prompt}")
-            sys.stdout.flush()
-            messages = [
-                {"role": "system", "content": system_prompt}
-            ]
-            if history and isinstance(history, list) and len(history) > 0:
-                messages += history
-            messages.append({"role": "user", "content": question})
+                return EMPTY_RESUME_ANSWER
+            if resume_keywords is None:
+                resume_keywords = keywords(resume_text)
+        route = self._smart_route(question, resume_keywords, is_intro) if mode == "resume" else None
+        with stage('prompt_build'):
+            messages = self._route_messages(question, resume_text, mode, history, is_intro, route, resume_index)
+        max_tokens, temperature, model = self._route_params(mode, is_intro, route, question, history)
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                max_tokens=512,
-                temperature=(0.5 if (mode == "resume" and is_intro) else (0.45 if mode == "resume" else 0.7)),
-            )
-            answer = response.choices[0].message.content.strip()
+            answer = self._complete(messages, max_tokens, temperature, 'openai_primary', user, model)
             # --- STRICTEST SMART MODE FILTER (ENHANCED) ---
             if mode == "resume" and resume_text and resume_text.strip():
-                import re as _re
-                forbidden_phrases = [
-                    "as an ai language model", "as an interview assistant", "i'm sorry", "i am unable to", "i cannot answer",
-                    "based on the information provided", "based on your resume", "template", "sample", "example", "generic", "fallback", "instructional", "structured", "suggested", "possible answer", "general answer", "response:",
-                    "this is a template", "here is a template", "here is an example", "here is a sample", "sample response", "for example", "for instance", "let's", "in summary", "in conclusion", "overall", "as an ", "as a ", "to answer"
-                ]
-                template_patterns = [
-                    r"^answer[:\-]", r"^template[:\-]", r"^sample answer[:\-]", r"^example[:\-]", r"^suggested answer[:\-]", r"^possible answer[:\-]", r"^response[:\-]", r"^here is", r"^this is", r"^let's", r"^to answer", r"^in summary", r"^in conclusion", r"^overall", r"^as an? ",
-                ]
-                def is_template(text, resume_text):
-                    text = text.strip().lower()
-                    if not text:
-                        return True
-                    if any(phrase in text for phrase in forbidden_phrases):
-                        return True
-                    if any(_re.match(p, text, _re.IGNORECASE) for p in template_patterns):
-                        return True
-                    # Block if answer contains numbered/stepwise/list structure
-                    if any(text.startswith(x) for x in ["1.", "step 1", "first,", "here's a structured", "here is a structured", "here is how", "here's how", "to answer this question, you should", "to answer this question:", "here are some steps", "here are some ways", "here are some points", "here are some tips", "here are some suggestions"]):
-                        return True
-                    # Block if answer contains multiple numbered points or bullet points
-                    if any(x in text for x in ["2.", "3.", "4.", "- ", "• "]):
-                        return True
-                    # Block if answer is long but does not mention any unique resume keyword
-                    resume_keywords = set(w.lower() for w in _re.findall(r"[A-Za-z]{4,}", resume_text))
-                    answer_words = set(w.lower() for w in _re.findall(r"[A-Za-z]{4,}", text))
-                    if len(text) > 60 and len(resume_keywords & answer_words) == 0:
-                        return True
-                    # Block if answer starts with a generic phrase and does not mention any resume keyword
-                    generic_starts = ["i am", "my name is", "i have", "i possess", "i am a", "i'm a", "i'm an"]
-                    if any(text.startswith(gs) for gs in generic_starts) and len(resume_keywords & answer_words) == 0:
-                        return True
-                    return False
+                filter_start = time.perf_counter()
                 # In Smart mode, always return the OpenAI-generated answer unless it is a template or forbidden phrase.
                 # If answer is not based on resume context (no overlap with resume keywords), provide a general answer (not a template).
-                forbidden = [
-                    "template", "sample", "example", "generic", "fallback", "instructional", "structured", "suggested", "possible answer", "response:",
-                    "this is a template", "here is a template", "here is an example", "here is a sample", "sample response", "for example", "for instance"
-                ]
                 # Check for forbidden phrases
-                if any(f in answer.lower() for f in forbidden):
-                    answer = "[Error: The answer was blocked because it looked like a template or sample. Please rephrase your question.]"
-                else:
+                verdict = answer_filter.classify(answer, resume_keywords)
+                STAGE_SECONDS.observe(time.perf_counter() - filter_start, stage='filter')
+                if verdict == "blocked":
+                    answer = BLOCKED_ANSWER
+                elif route == "resume" and verdict == "no_overlap":
                     # Check if answer is based on resume context (overlap with resume keywords)
-                    resume_keywords = set(w.lower() for w in _re.findall(r"[A-Za-z]{4,}", resume_text))
-                    answer_words = set(w.lower() for w in _re.findall(r"[A-Za-z]{4,}", answer))
                     # If no overlap and resume doesn't cover the question, provide a general answer (not a template)
-                    if len(resume_keywords & answer_words) == 0:
-                        # General mode system prompt
-                        general_prompt = (
-                            "You are a helpful interview assistant. Provide a concise, practical, and specific answer to the user's question. Do not use a template, sample, or generic structure. Answer in first person as if you are the user."
-                        )
-                        messages = [
-                            {"role": "system", "content": general_prompt},
-                            {"role": "user", "content": question}
-                        ]
+                    if self.smart_single_pass:
+                        # The question scored as covered by the resume, keep the one answer we paid for
+                        self._count('fallback_skipped')
+                    else:
+                        self._count('fallback_calls')
+                        messages = self._general_messages(question, history)
                         try:
-                            response2 = self.client.chat.completions.create(
-                                model="gpt-4o",
-                                messages=messages,
-                                max_tokens=256,
-                                temperature=0.6,
-                            )
-                            answer2 = response2.choices[0].message.content.strip()
+                            answer2 = self._complete(messages, 256, 0.6, 'openai_fallback', user)
                             # Block if general answer is a template
-                            if any(f in answer2.lower() for f in forbidden):
-                                answer = "[Error: The answer was blocked because it looked like a template or sample. Please rephrase your question.]"
+                            if self._is_forbidden(answer2):
+                                answer = BLOCKED_ANSWER
                             else:
                                 answer = answer2
                         except Exception as e:
-                            answer = "[Error: Could not generate a general answer.]"
-            print(f"[DEBUG] Answer returned (mode={mode}): {answer[:300]}")
-            sys.stdout.flush()
+                            answer = self._error_answer(e, "[Error: Could not generate a general answer.]")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Answer returned (mode=%s): %s", mode, answer[:300])
             return answer
         except Exception as e:
-            print(f"[DEBUG] Exception in generate_response: {e}")
-            sys.stdout.flush()
-            return "[Error: Could not generate answer.]"
+            log.warning("Exception in generate_response: %s", e)
+            return self._error_answer(e)
+
+    def _complete(self, messages, max_tokens, temperature, stage_name, user=None, model=None):
+        model = model or self.model_full
+        estimate = _estimate_call_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            with self.scheduler.slot(user, estimate) as ticket:
+                start = time.perf_counter()
+                try:
+                    with stage(stage_name):
+                        response = self.client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                        )
+                except Exception as e:
+                    ticket.used_tokens = 0
+                    delay = self.scheduler.retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    usage = getattr(response, 'usage', None)
+                    ticket.used_tokens = getattr(usage, 'total_tokens', None)
+                    record_usage(usage)
+                    self._record_call(model, usage, time.perf_counter() - start)
+                    return response.choices[0].message.content.strip()
+            attempt += 1
+            log.info("OpenAI call failed, retry %d in %.2fs", attempt, delay)
+            time.sleep(delay)
+
+    @staticmethod
+    def _error_answer(error, default=ERROR_ANSWER):
+        if isinstance(error, SchedulerBusy) or getattr(error, 'status_code', None) == 429:
+            return RATE_LIMITED_ANSWER
+        return default
+
+    def _resume_context(self, question, resume_text, resume_index=None):
+        # Only the resume sections relevant to the question go into the prompt
+        if not self.resume_retrieval:
+            return resume_text
+        index = resume_index or ResumeIndex(resume_text)
+        budget = self.resume_token_budget
+        prefix_tokens = estimate_tokens(SMART_PREFIX_PROMPT) + index.total_tokens
+        if self.prompt_cache_full_resume and self.prompt_cache_min_tokens <= prefix_tokens <= self.prompt_cache_max_tokens:
+            budget = index.total_tokens
+            self._count('resume_prompts_full')
+        context, sent = index.select(question, top_k=self.resume_top_k, token_budget=budget)
+        saved = index.total_tokens - sent
+        self._count('resume_prompts')
+        self._count('resume_tokens_full', index.total_tokens)
+        self._count('resume_tokens_saved', saved)
+        RESUME_TOKENS_SAVED.observe(saved)
+        log.debug("Resume context: %d of %d est. tokens sent (saved %d)", sent, index.total_tokens, saved)
+        return context
+
+    def _build_messages(self, question, resume_text, mode, history, is_intro, resume_index=None):
+        # Layout for upstream prompt caching: [fixed instructions + resume] [history] [per-question
+        # instruction] [question]. The first message is byte-identical for every question about the
+        # same resume (whenever retrieval sends it whole), so only the tail is new to the API.
+        if mode == "resume":
+            resume_text = self._resume_context(question, resume_text, resume_index)
+            # Smart mode: Use resume context if possible, else give a direct answer. STRONG anti-template instructions.
+            system_prompt = SMART_PREFIX_PROMPT + resume_text
+            question_prompt = SMART_INTRO_PROMPT if is_intro else SMART_QUESTION_PROMPT
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("SMART MODE PROMPT SENT TO OPENAI:\n%s", system_prompt[:1000])
+        else:
+            # Global mode: answer purely general questions
+            system_prompt = GLOBAL_PROMPT
+            question_prompt = None
+            log.debug("GLOBAL MODE PROMPT SENT TO OPENAI:\n%s", system_prompt)
+        messages = [
+            {"role": "system", "content": system_prompt}
+        ]
+        if history and isinstance(history, list) and len(history) > 0:
+            messages += history
+        if question_prompt:
+            messages.append({"role": "system", "content": question_prompt})
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def _note_prefix(self, messages):
+        # Fingerprint of the cacheable prefix; a repeat means the API should report cached tokens
+        fingerprint = prefix_fingerprint(messages)
+        if estimate_tokens(messages[0]["content"]) < self.prompt_cache_min_tokens:
+            # Too short for the API to cache, so a repeat would not be a cache hit
+            self._count('prefix_uncacheable')
+            return fingerprint
+        with self._stats_lock:
+            if fingerprint in self._recent_prefixes:
+                self._recent_prefixes.move_to_end(fingerprint)
+                self._stats['prefix_repeats'] += 1
+            else:
+                self._recent_prefixes[fingerprint] = True
+                if len(self._recent_prefixes) > RECENT_PREFIXES:
+                    self._recent_prefixes.popitem(last=False)
+                self._stats['prefix_new'] += 1
+        log.debug("Prompt prefix %s", fingerprint)
+        return fingerprint
+
+    def _smart_route(self, question, resume_keywords, is_intro):
+        # "resume" answers from the resume prompt, "general" goes straight to general_prompt
+        self._count('smart_requests')
+        if not self.smart_single_pass:
+            return "resume"
+        if (is_intro or CANDIDATE_RE.search(question.lower())
+                or self._resume_relevance(question, resume_keywords) > self.relevance_threshold):
+            self._count('routed_resume')
+            return "resume"
+        self._count('routed_general')
+        return "general"
+
+    @staticmethod
+    def _resume_relevance(question, resume_keywords):
+        # Share of the question's content words that also appear in the resume
+        terms = keywords(question) - QUESTION_STOPWORDS
+        if not terms:
+            return 1.0
+        return len(terms & resume_keywords) / len(terms)
+
+    def _route_messages(self, question, resume_text, mode, history, is_intro, route, resume_index=None):
+        if route == "general":
+            messages = self._general_messages(question, history)
+        else:
+            messages = self._build_messages(question, resume_text, mode, history, is_intro, resume_index)
+        self._note_prefix(messages)
+        return messages
+
+    def _route_params(self, mode, is_intro, route, question="", history=None):
+        # (max_tokens, temperature, model) for the single upstream call
+        if route == "general":
+            max_tokens, temperature = 256, 0.6
+        else:
+            max_tokens, temperature = 512, self._temperature(mode, is_intro)
+        tier = self._model_tier(mode, is_intro, route, question, history)
+        self._count('tier_' + tier)
+        if tier == "fast":
+            return min(max_tokens, self.fast_max_tokens), temperature, self.model_fast
+        return max_tokens, temperature, self.model_full
+
+    def _model_tier(self, mode, is_intro, route, question, history):
+        if not self.model_routing or is_intro:
+            return "full"
+        # Smart questions the resume does not cover get the same short-question rule as Global mode
+        if (mode != "resume" or route == "general") and len(question.split()) <= self.fast_max_words and _history_turns(history) <= self.fast_max_history:
+            return "fast"
+        return "full"
+
+    def _record_call(self, model, usage, seconds):
+        # Per-tier latency and estimated cost, for tuning the routing thresholds
+        tier = "fast" if model == self.model_fast and model != self.model_full else "full"
+        MODEL_CALL_SECONDS.observe(seconds, tier=tier, model=model)
+        price = self.model_prices.get(model)
+        if usage is None or price is None:
+            return
+        prompt = getattr(usage, 'prompt_tokens', 0) or 0
+        cached = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', 0) or 0
+        completion = getattr(usage, 'completion_tokens', 0) or 0
+        # Cached prompt tokens are billed at half the input price
+        cost = ((prompt - cached / 2) * price[0] + completion * price[1]) / 1_000_000
+        MODEL_COST_USD.inc(cost, tier=tier, model=model)
+
+    @staticmethod
+    def _temperature(mode, is_intro):
+        return 0.5 if (mode == "resume" and is_intro) else (0.45 if mode == "resume" else 0.7)
+
+    @staticmethod
+    def _general_messages(question, history=None):
+        # General mode system prompt, used when the resume does not cover the question
+        general_prompt = (
+            "You are a helpful interview assistant. Provide a concise, practical, and specific answer to the user's question. Do not use a template, sample, or generic structure. Answer in first person as if you are the user."
+        )
+        messages = [{"role": "system", "content": general_prompt}]
+        if history and isinstance(history, list):
+            messages += history
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    @staticmethod
+    def _is_forbidden(answer):
+        return answer_filter.is_forbidden(answer)
+
+    def stream_response(self, question, resume_text=None, mode="global", history=None, resume_keywords=None, resume_index=None, user=None):
+        """Yield (event, payload) tuples as the model produces tokens.
+
+        Events are "token" (text delta), "reset" (discard what was streamed so far),
+        "blocked" (final replacement answer) and "done" (full answer). In Smart mode
+        the forbidden-phrase check runs on the growing answer, so a template answer
+        is cut off mid-stream instead of after the full completion.
+        """
+        if not question.strip():
+            yield "done", "No question provided."
+            return
+        is_intro = self._is_intro_question(question)
+        if mode == "resume" and (not resume_text or not resume_text.strip()):
+            yield "done", EMPTY_RESUME_ANSWER
+            return
+        smart = mode == "resume"
+        if smart and resume_keywords is None:
+            resume_keywords = keywords(resume_text)
+        route = self._smart_route(question, resume_keywords, is_intro) if smart else None
+        with stage('prompt_build'):
+            messages = self._route_messages(question, resume_text, mode, history, is_intro, route, resume_index)
+        max_tokens, temperature, model = self._route_params(mode, is_intro, route, question, history)
+        try:
+            answer = yield from self._stream_completion(
+                messages, max_tokens, temperature, check_forbidden=smart, stage_name='openai_primary', user=user,
+                model=model)
+        except Exception as e:
+            log.warning("Exception in stream_response: %s", e)
+            yield "done", self._error_answer(e)
+            return
+        if answer is None:
+            yield "blocked", BLOCKED_ANSWER
+            return
+        answer = answer.strip()
+        if route == "resume" and not answer_filter.has_overlap(answer, resume_keywords):
+            if self.smart_single_pass:
+                self._count('fallback_skipped')
+                yield "done", answer
+                return
+            # Same fallback as generate_response: answer generally when the resume is not used
+            self._count('fallback_calls')
+            yield "reset", None
+            try:
+                answer = yield from self._stream_completion(
+                    self._general_messages(question, history), 256, 0.6, check_forbidden=True, stage_name='openai_fallback', user=user)
+            except Exception as e:
+                yield "done", self._error_answer(e, "[Error: Could not generate a general answer.]")
+                return
+            if answer is None:
+                yield "blocked", BLOCKED_ANSWER
+                return
+            answer = answer.strip()
+        yield "done", answer
+
+    def _stream_completion(self, messages, max_tokens, temperature, check_forbidden=False, stage_name='openai_stream', user=None,
+                           model=None):
+        # Returns the full text, or None if a forbidden phrase appeared and the stream was cut off
+        model = model or self.model_full
+        estimate = _estimate_call_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            # The slot is held for the whole stream; only opening it can be retried
+            ticket = self.scheduler.acquire(user, estimate)
+            start = time.perf_counter()
+            try:
+                stream = self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                break
+            except Exception as e:
+                ticket.used_tokens = 0
+                self.scheduler.release(ticket)
+                delay = self.scheduler.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            attempt += 1
+            time.sleep(delay)
+        parts = []
+        lowered = ""
+        usage = None
+        try:
+            for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    usage = chunk.usage
+                    record_usage(usage)
+                    ticket.used_tokens = getattr(usage, 'total_tokens', None)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if not parts:
+                    STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage_name + '_first_token')
+                parts.append(delta)
+                if check_forbidden:
+                    # Only the tail can contain a phrase that was not there before this delta
+                    lowered = lowered[-answer_filter.max_forbidden_len:] + delta.lower()
+                    if answer_filter.forbidden_re.search(lowered):
+                        return None
+                yield "token", delta
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage_name)
+            self._record_call(model, usage, time.perf_counter() - start)
+            if hasattr(stream, "close"):
+                stream.close()
+            self.scheduler.release(ticket)
+        return "".join(parts)
 
     def build_prompt(self, question, resume_text, mode):
         # Kept for compatibility; main logic handled in generate_response
@@ -171,3 +532,214 @@ class GPTEngine:
         ]
         return any(re.search(p, q) for p in patterns)
 
+
+class AsyncGPTEngine(GPTEngine):
+    """GPTEngine for the asyncio server (async_server.py).
+
+    Uses AsyncOpenAI on one shared connection pool and caps the number of
+    completions in flight with a semaphore; prompts and Smart-mode filtering
+    are shared with the sync engine.
+    """
+
+    def __init__(self, max_concurrency=None):
+        load_dotenv()
+        self._api_key = os.getenv('OPENAI_API_KEY')
+        self._pool_size = max_concurrency or int(os.getenv('OPENAI_MAX_CONCURRENCY', 256))
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._semaphore = asyncio.Semaphore(self._pool_size)
+        self._init_routing()
+
+    def _make_client(self):
+        import httpx
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=self._api_key, max_retries=0, http_client=httpx.AsyncClient(limits=_pool_limits(self._pool_size)))
+
+    async def _complete(self, messages, max_tokens, temperature, stage_name, user=None, model=None):
+        model = model or self.model_full
+        estimate = _estimate_call_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            async with self.scheduler.aslot(user, estimate) as ticket, self._semaphore:
+                start = time.perf_counter()
+                try:
+                    with stage(stage_name):
+                        response = await self.client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                        )
+                except Exception as e:
+                    ticket.used_tokens = 0
+                    delay = self.scheduler.retry_delay(e, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    usage = getattr(response, 'usage', None)
+                    ticket.used_tokens = getattr(usage, 'total_tokens', None)
+                    record_usage(usage)
+                    self._record_call(model, usage, time.perf_counter() - start)
+                    return response.choices[0].message.content.strip()
+            attempt += 1
+            log.info("OpenAI call failed, retry %d in %.2fs", attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def generate_response(self, question, resume_text=None, mode="global", history=None, resume_keywords=None, resume_index=None, user=None):
+        if not question.strip():
+            return "No question provided."
+        is_intro = self._is_intro_question(question)
+        if mode == "resume" and (not resume_text or not resume_text.strip()):
+            return EMPTY_RESUME_ANSWER
+        if mode == "resume" and resume_keywords is None:
+            resume_keywords = keywords(resume_text)
+        route = self._smart_route(question, resume_keywords, is_intro) if mode == "resume" else None
+        with stage('prompt_build'):
+            messages = self._route_messages(question, resume_text, mode, history, is_intro, route, resume_index)
+        max_tokens, temperature, model = self._route_params(mode, is_intro, route, question, history)
+        try:
+            answer = await self._complete(messages, max_tokens, temperature, 'openai_primary', user, model)
+        except Exception as e:
+            log.warning("Exception in async generate_response: %s", e)
+            return self._error_answer(e)
+        if mode == "resume":
+            if self._is_forbidden(answer):
+                return BLOCKED_ANSWER
+            if route == "resume" and not answer_filter.has_overlap(answer, resume_keywords):
+                if self.smart_single_pass:
+                    self._count('fallback_skipped')
+                    return answer
+                self._count('fallback_calls')
+                try:
+                    answer2 = await self._complete(self._general_messages(question, history), 256, 0.6, 'openai_fallback', user)
+                except Exception as e:
+                    return self._error_answer(e, "[Error: Could not generate a general answer.]")
+                return BLOCKED_ANSWER if self._is_forbidden(answer2) else answer2
+        return answer
+
+    async def stream_response(self, question, resume_text=None, mode="global", history=None, resume_keywords=None, resume_index=None, user=None):
+        """Async generator with the same (event, payload) tuples as GPTEngine.stream_response."""
+        if not question.strip():
+            yield "done", "No question provided."
+            return
+        is_intro = self._is_intro_question(question)
+        if mode == "resume" and (not resume_text or not resume_text.strip()):
+            yield "done", EMPTY_RESUME_ANSWER
+            return
+        smart = mode == "resume"
+        if smart and resume_keywords is None:
+            resume_keywords = keywords(resume_text)
+        route = self._smart_route(question, resume_keywords, is_intro) if smart else None
+        with stage('prompt_build'):
+            messages = self._route_messages(question, resume_text, mode, history, is_intro, route, resume_index)
+        max_tokens, temperature, model = self._route_params(mode, is_intro, route, question, history)
+        parts = []
+        events = self._astream_completion(messages, max_tokens, temperature, check_forbidden=smart,
+                                          stage_name='openai_primary', user=user, model=model)
+        try:
+            async for event, payload in events:
+                yield event, payload
+                if event == "blocked":
+                    return
+                parts.append(payload)
+        except Exception as e:
+            log.warning("Exception in async stream_response: %s", e)
+            yield "done", self._error_answer(e)
+            return
+        finally:
+            await events.aclose()
+        answer = "".join(parts).strip()
+        if route == "resume" and not answer_filter.has_overlap(answer, resume_keywords):
+            if self.smart_single_pass:
+                self._count('fallback_skipped')
+                yield "done", answer
+                return
+            self._count('fallback_calls')
+            yield "reset", None
+            parts = []
+            events = self._astream_completion(self._general_messages(question, history), 256, 0.6, check_forbidden=True,
+                                              stage_name='openai_fallback', user=user)
+            try:
+                async for event, payload in events:
+                    yield event, payload
+                    if event == "blocked":
+                        return
+                    parts.append(payload)
+            except Exception as e:
+                yield "done", self._error_answer(e, "[Error: Could not generate a general answer.]")
+                return
+            finally:
+                await events.aclose()
+            answer = "".join(parts).strip()
+        yield "done", answer
+
+    async def _astream_completion(self, messages, max_tokens, temperature, check_forbidden=False,
+                                  stage_name='openai_stream', user=None, model=None):
+        # Yields ("token", delta) events, then ("blocked", ...) if a forbidden phrase cut the stream off
+        model = model or self.model_full
+        estimate = _estimate_call_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            # The slot is held for the whole stream; only opening it can be retried
+            ticket = await self.scheduler.acquire_async(user, estimate)
+            start = time.perf_counter()
+            try:
+                await self._semaphore.acquire()
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    )
+                except BaseException:
+                    self._semaphore.release()
+                    raise
+                break
+            except Exception as e:
+                ticket.used_tokens = 0
+                self.scheduler.release(ticket)
+                delay = self.scheduler.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                self.scheduler.release(ticket)
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+        lowered = ""
+        usage = None
+        first = True
+        try:
+            async for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    usage = chunk.usage
+                    record_usage(usage)
+                    ticket.used_tokens = getattr(usage, 'total_tokens', None)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first:
+                    STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage_name + '_first_token')
+                    first = False
+                if check_forbidden:
+                    lowered = lowered[-answer_filter.max_forbidden_len:] + delta.lower()
+                    if answer_filter.forbidden_re.search(lowered):
+                        yield "blocked", BLOCKED_ANSWER
+                        return
+                yield "token", delta
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage_name)
+            self._record_call(model, usage, time.perf_counter() - start)
+            self._semaphore.release()
+            self.scheduler.release(ticket)
+            if hasattr(stream, "close"):
+                await stream.close()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
@@ -0,0 +1,284 @@
+import asyncio
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import Counter, Histogram
+
+QUEUE_WAIT_SECONDS = Histogram('llm_queue_wait_seconds', 'Time an OpenAI call waited in the scheduler queue')
+UPSTREAM_RATE_LIMITED = Counter('llm_upstream_rate_limited_total', 'OpenAI 429 responses, by outcome', ['outcome'])
+
+# Idle per-user buckets kept around; older ones are dropped (a new bucket starts full)
+MAX_USER_BUCKETS = 10000
+# openai exception types (by name, so openai stays a lazy import) worth retrying
+RETRYABLE_ERRORS = {'APIConnectionError', 'APITimeoutError'}
+# Longest an async waiter sleeps before re-checking the queue
+ASYNC_POLL_SECONDS = 0.05
+
+
+class SchedulerBusy(Exception):
+    """Raised when a call waited longer than max_wait for its turn."""
+
+
+class TokenBucket:
+    """Refills at `per_minute` units per minute up to `burst`; per_minute <= 0 means unlimited."""
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def delay(self, n, now):
+        """Seconds until `n` units are available (0 if they are now)."""
+        if self.rate <= 0:
+            return 0.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # A single call larger than the whole bucket waits for a full bucket, then runs into debt
+        need = min(n, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def take(self, n):
+        if self.rate > 0:
+            self.level -= n
+
+    def give_back(self, n):
+        if self.rate > 0:
+            self.level = min(self.capacity, self.level + n)
+
+
+class _Ticket:
+    __slots__ = ('user', 'tokens', 'enqueued', 'granted', 'used_tokens')
+
+    def __init__(self, user, tokens):
+        self.user = user
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.used_tokens = None  # set by the caller from the API usage, to settle the estimate
+
+
+class LLMScheduler:
+    """Admission control for OpenAI calls: rate limits, fair queueing and 429 backoff.
+
+    Every call takes a request and its estimated tokens from a global bucket
+    and from the caller's per-user bucket (by email), and a concurrency slot.
+    Waiting calls are queued per user and granted round-robin, so one user's
+    backlog cannot starve everyone else. An upstream 429 pauses all dispatch
+    for the retry-after time (or an exponential backoff) before the call is
+    retried; calls that wait longer than `max_wait` raise SchedulerBusy.
+    """
+
+    def __init__(self, max_concurrency=32, global_rpm=0, global_tpm=0, user_rpm=0, user_tpm=0,
+                 max_wait=60.0, max_retries=3, backoff_base=0.5, backoff_max=20.0):
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.user_rpm = user_rpm
+        self.user_tpm = user_tpm
+        self._global = (TokenBucket(global_rpm), TokenBucket(global_tpm))
+        self._users = OrderedDict()  # user -> (request bucket, token bucket)
+        self._queues = OrderedDict()  # user -> deque of waiting tickets, in round-robin order
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self.granted = 0
+        self.rejected = 0
+        self.retries = 0
+
+    @contextmanager
+    def slot(self, user, tokens):
+        ticket = self.acquire(user, tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, user, tokens):
+        ticket = await self.acquire_async(user, tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def acquire(self, user, tokens):
+        with self._cond:
+            ticket = self._enqueue(user, tokens)
+            try:
+                while True:
+                    delay = self._dispatch()
+                    if ticket.granted:
+                        return ticket
+                    remaining = self._remaining(ticket)
+                    self._cond.wait(min(remaining, delay) if delay else remaining)
+            except BaseException:
+                self._abandon(ticket)
+                raise
+
+    async def acquire_async(self, user, tokens):
+        with self._cond:
+            ticket = self._enqueue(user, tokens)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._dispatch()
+                    if ticket.granted:
+                        return ticket
+                    remaining = self._remaining(ticket)
+                await asyncio.sleep(min(remaining, delay or ASYNC_POLL_SECONDS, ASYNC_POLL_SECONDS))
+        except BaseException:
+            # Cancelled (client gone, timeout, shutdown) or SchedulerBusy: leave no ticket or slot behind
+            with self._cond:
+                self._abandon(ticket)
+            raise
+
+    def release(self, ticket):
+        with self._cond:
+            self._in_flight -= 1
+            if ticket.used_tokens is not None:
+                # Settle the estimate against what the API actually reported
+                surplus = ticket.tokens - ticket.used_tokens
+                for bucket in (self._global[1], self._user_buckets(ticket.user)[1]):
+                    if surplus > 0:
+                        bucket.give_back(surplus)
+                    else:
+                        bucket.take(-surplus)
+            self._cond.notify_all()
+
+    def retry_delay(self, error, attempt):
+        """Seconds to wait before retrying a failed call, or None if `error` should not be retried.
+
+        429s, 5xx responses and connection errors are retried up to max_retries
+        times. A 429 also pauses all dispatch for the retry-after time, since
+        every queued call shares the same upstream limit.
+        """
+        status = getattr(error, 'status_code', None)
+        rate_limited = status == 429
+        if not (rate_limited or (status is not None and status >= 500)
+                or type(error).__name__ in RETRYABLE_ERRORS):
+            return None
+        if attempt >= self.max_retries:
+            if rate_limited:
+                UPSTREAM_RATE_LIMITED.inc(outcome='gave_up')
+            return None
+        delay = None
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            if headers.get('retry-after-ms'):
+                delay = float(headers['retry-after-ms']) / 1000
+            elif headers.get('retry-after'):
+                delay = float(headers['retry-after'])
+        except ValueError:
+            delay = None
+        if delay is None:
+            delay = self.backoff_base * (2 ** attempt) * (0.5 + random.random())
+        delay = min(delay, self.backoff_max)
+        with self._cond:
+            self.retries += 1
+            if rate_limited:
+                UPSTREAM_RATE_LIMITED.inc(outcome='retried')
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queue_depth': sum(len(q) for q in self._queues.values()),
+                'users_waiting': len(self._queues),
+                'in_flight': self._in_flight,
+                'granted': self.granted,
+                'rejected': self.rejected,
+                'retries': self.retries,
+                'paused': 1 if self._paused_until > time.monotonic() else 0,
+            }
+
+    def _enqueue(self, user, tokens):
+        ticket = _Ticket(user or '', tokens)
+        self._queues.setdefault(ticket.user, deque()).append(ticket)
+        return ticket
+
+    def _remaining(self, ticket):
+        # Time left before the ticket gives up; removes it and raises once that is zero
+        remaining = self.max_wait - (time.monotonic() - ticket.enqueued)
+        if remaining > 0:
+            return remaining
+        self._abandon(ticket)
+        self.rejected += 1
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - ticket.enqueued)
+        raise SchedulerBusy(f"waited more than {self.max_wait:g}s for an OpenAI slot")
+
+    def _abandon(self, ticket):
+        # A waiter gave up: drop its ticket from the queue, or free the slot if it was granted meanwhile
+        if ticket.granted:
+            ticket.granted = False
+            self._in_flight -= 1
+        else:
+            queue = self._queues.get(ticket.user)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.user]
+        self._cond.notify_all()
+
+    def _user_buckets(self, user):
+        buckets = self._users.get(user)
+        if buckets is None:
+            buckets = self._users[user] = (TokenBucket(self.user_rpm), TokenBucket(self.user_tpm))
+            while len(self._users) > MAX_USER_BUCKETS:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user)
+        return buckets
+
+    def _dispatch(self):
+        """Grant every ticket that may run now, one per user per pass.
+
+        Returns seconds until the next ticket could become eligible, or None
+        when only a release can unblock the queue. Called with the lock held.
+        """
+        now = time.monotonic()
+        if self._paused_until > now:
+            return self._paused_until - now
+        next_delay = None
+        granted_any = False
+        progressed = True
+        while progressed and not self._full():
+            progressed = False
+            for user in list(self._queues):
+                if self._full():
+                    break
+                ticket = self._queues[user][0]
+                global_requests, global_tokens = self._global
+                user_requests, user_tokens = self._user_buckets(user)
+                delay = max(global_requests.delay(1, now), user_requests.delay(1, now),
+                            global_tokens.delay(ticket.tokens, now), user_tokens.delay(ticket.tokens, now))
+                if delay > 0:
+                    next_delay = delay if next_delay is None else min(next_delay, delay)
+                    continue
+                global_requests.take(1)
+                user_requests.take(1)
+                global_tokens.take(ticket.tokens)
+                user_tokens.take(ticket.tokens)
+                queue = self._queues[user]
+                queue.popleft()
+                if queue:
+                    self._queues.move_to_end(user)
+                else:
+                    del self._queues[user]
+                ticket.granted = True
+                self._in_flight += 1
+                self.granted += 1
+                QUEUE_WAIT_SECONDS.observe(now - ticket.enqueued)
+                progressed = granted_any = True
+        if granted_any:
+            self._cond.notify_all()
+        return next_delay
+
+    def _full(self):
+        return bool(self.max_concurrency) and self._in_flight >= self.max_concurrency
@@ -0,0 +1,132 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers fast cache hits up to slow multi-call LLM answers
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+_metrics = []
+_collectors = []
+
+
+def setup_logging():
+    # LOG_LEVEL=DEBUG brings back the old per-request debug output; the default keeps the hot path quiet
+    level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    logging.basicConfig(level=getattr(logging, level, logging.INFO),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+def _label_str(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, '') for n in self.labelnames)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+def register_collector(prefix, collect):
+    """Export a component's stats() dict as gauges named <prefix>_<key> on each scrape."""
+    _collectors.append((prefix, collect))
+
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for prefix, collect in _collectors:
+        for key, value in sorted(collect().items()):
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {prefix}_{key} gauge")
+                lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram('ask_stage_seconds', 'Time spent in each /ask pipeline stage', ['stage'])
+OPENAI_TOKENS = Counter('openai_tokens_total', 'Tokens reported by OpenAI usage', ['kind'])
+OPENAI_CALL_TOKENS = Histogram('openai_call_tokens', 'Tokens per OpenAI call', ['kind'], TOKEN_BUCKETS)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+def record_usage(usage):
+    if usage is None:
+        return
+    for kind in ('prompt_tokens', 'completion_tokens'):
+        value = getattr(usage, kind, None)
+        if value is not None:
+            OPENAI_TOKENS.inc(value, kind=kind)
+            OPENAI_CALL_TOKENS.observe(value, kind=kind)
+    # Prompt tokens served from the upstream prompt cache (the stable instructions + resume prefix)
+    cached = getattr(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens', None)
+    if cached is not None:
+        OPENAI_TOKENS.inc(cached, kind='cached_prompt_tokens')
+        OPENAI_CALL_TOKENS.observe(cached, kind='cached_prompt_tokens')
@@ -0,0 +1,129 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from answer_filter import keywords
+from resume_index import ResumeIndex
+
+
+class ResumeEntry:
+    """Parsed resume kept in the registry, keyed by the sha256 of the uploaded bytes."""
+
+    def __init__(self, resume_id, filename, text, size):
+        self.resume_id = resume_id
+        self.filename = filename
+        self.text = text
+        self.size = size
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self._keywords = None
+        self._index = None
+
+    @property
+    def keywords(self):
+        # Built on the first Smart-mode question for this resume and reused afterwards
+        if self._keywords is None:
+            self._keywords = keywords(self.text)
+        return self._keywords
+
+    @property
+    def index(self):
+        # BM25 section index used to pick the resume chunks sent with each question
+        if self._index is None:
+            self._index = ResumeIndex(self.text)
+        return self._index
+
+    @property
+    def cost(self) -> int:
+        # Memory accounted against the registry budget (raw upload + parsed text)
+        return self.size + len(self.text or '')
+
+
+class ResumeRegistry:
+    """Content-addressed LRU of parsed resumes with size and TTL eviction.
+
+    Uploading the same bytes twice returns the cached parse, and clients can
+    refer to an earlier upload by its resume_id instead of re-sending the file.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, ttl=6 * 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def content_id(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, resume_id):
+        if not resume_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(resume_id)
+            if entry is None:
+                return None
+            now = time.monotonic()
+            if self.ttl and now - entry.last_used > self.ttl:
+                self._remove(resume_id)
+                return None
+            entry.last_used = now
+            self._entries.move_to_end(resume_id)
+            return entry
+
+    def get_or_parse(self, data, filename, parse, resume_id=None):
+        """Return (entry, cached). `parse(data, filename)` runs only on a cache miss.
+
+        `resume_id` may be passed when the caller already hashed the bytes; `data`
+        may then be a callable returning them, so a hit never reads the upload.
+        """
+        resume_id = resume_id or self.content_id(data)
+        entry = self.get(resume_id)
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+            return entry, True
+        if callable(data):
+            data = data()
+        # Parse outside the lock so slow PDFs don't block lookups for other users
+        text = parse(data, filename) or ''
+        entry = ResumeEntry(resume_id, filename, text, len(data))
+        with self._lock:
+            self.misses += 1
+            if resume_id in self._entries:
+                self._remove(resume_id)
+            self._entries[resume_id] = entry
+            self._bytes += entry.cost
+            self._evict()
+        return entry, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, resume_id):
+        entry = self._entries.pop(resume_id)
+        self._bytes -= entry.cost
+
+    def _evict(self):
+        now = time.monotonic()
+        if self.ttl:
+            for resume_id in [k for k, e in self._entries.items() if now - e.last_used > self.ttl]:
+                self._remove(resume_id)
+                self.evictions += 1
+        # Always keep the newest entry, even if it alone exceeds the byte budget
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
@@ -0,0 +1,123 @@
+import math
+import re
+from collections import Counter
+
+# Common resume section titles; any short all-caps line is treated as a heading too
+SECTION_TITLES = {
+    "summary", "profile", "professional summary", "objective", "about me", "experience", "work experience",
+    "professional experience", "employment", "employment history", "education", "skills", "technical skills",
+    "core skills", "projects", "personal projects", "certifications", "certificates", "awards", "achievements",
+    "publications", "languages", "interests", "volunteering", "volunteer experience", "leadership", "activities",
+}
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+MAX_CHUNK_CHARS = 800
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text; good enough for budgeting without a tokenizer
+    return (len(text) + 3) // 4
+
+
+def tokenize(text):
+    return [t.rstrip('.') for t in TOKEN_RE.findall(text.lower()) if len(t) > 1]
+
+
+def _is_heading(line):
+    stripped = line.strip().rstrip(':').strip()
+    if not stripped or len(stripped) > 40:
+        return False
+    return stripped.lower() in SECTION_TITLES or (stripped.isupper() and any(c.isalpha() for c in stripped))
+
+
+def split_sections(text):
+    """Split resume text into section chunks at headings, capping each chunk at MAX_CHUNK_CHARS."""
+    sections = []
+    current = []
+    for line in text.splitlines():
+        if _is_heading(line) and current:
+            sections.append(current)
+            current = []
+        current.append(line)
+    if current:
+        sections.append(current)
+    chunks = []
+    for lines in sections:
+        heading = lines[0].strip() if _is_heading(lines[0]) else ''
+        buf = []
+        size = 0
+        for line in lines:
+            if buf and size + len(line) > MAX_CHUNK_CHARS:
+                chunks.append("\n".join(buf).strip())
+                # Keep the section heading on continuation chunks so they stay self-describing
+                buf = [heading] if heading else []
+                size = len(heading)
+            buf.append(line)
+            size += len(line) + 1
+        chunk = "\n".join(buf).strip()
+        # A heading with no body (e.g. followed directly by another heading) carries nothing to retrieve
+        if chunk and chunk != heading:
+            chunks.append(chunk)
+    return [c for c in chunks if c]
+
+
+class ResumeIndex:
+    """BM25 index over the sections of one resume, built once per parsed resume."""
+
+    def __init__(self, text, k1=1.5, b=0.75):
+        self.text = text or ''
+        self.k1 = k1
+        self.b = b
+        self.chunks = split_sections(self.text)
+        self.total_tokens = estimate_tokens(self.text)
+        self._chunk_tokens = [estimate_tokens(c) for c in self.chunks]
+        self._tfs = [Counter(tokenize(c)) for c in self.chunks]
+        self._lens = [sum(tf.values()) for tf in self._tfs]
+        self._avgdl = (sum(self._lens) / len(self._lens)) if self._lens else 0.0
+        df = Counter()
+        for tf in self._tfs:
+            df.update(tf.keys())
+        n = len(self.chunks)
+        self._idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, question):
+        terms = set(tokenize(question))
+        result = []
+        for tf, dl in zip(self._tfs, self._lens):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * dl / self._avgdl) if self._avgdl else self.k1
+            for t in terms:
+                f = tf.get(t)
+                if f:
+                    score += self._idf[t] * f * (self.k1 + 1) / (f + norm)
+            result.append(score)
+        return result
+
+    def select(self, question, top_k=4, token_budget=600, include_first=True):
+        """Return (context_text, tokens_sent) with the best chunks for the question.
+
+        The whole resume is returned when it already fits the budget. Otherwise
+        up to top_k chunks are picked by BM25 score (plus the first chunk, which
+        usually holds the name and headline) and joined in resume order.
+        """
+        if self.total_tokens <= token_budget or len(self.chunks) <= 1:
+            return self.text, self.total_tokens
+        scores = self.scores(question)
+        ranked = sorted(range(len(self.chunks)), key=lambda i: scores[i], reverse=True)
+        if include_first:
+            ranked = [0] + [i for i in ranked if i != 0]
+        picked = []
+        used = 0
+        for i in ranked:
+            if len(picked) >= top_k + (1 if include_first else 0):
+                break
+            if i != 0 and scores[i] <= 0 and picked:
+                break
+            if used + self._chunk_tokens[i] > token_budget:
+                continue
+            picked.append(i)
+            used += self._chunk_tokens[i]
+        if not picked:
+            # Budget smaller than any chunk: send the start of the resume, truncated to fit
+            text = self.text[:token_budget * 4]
+            return text, estimate_tokens(text)
+        return "\n\n".join(self.chunks[i] for i in sorted(picked)), used
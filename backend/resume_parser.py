@@ -1,16 +1,122 @@
-import fitz  
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
-def load_resume(file_path): 
+# Documents with at least this many pages are split across worker processes
+PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 16))
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', min(4, os.cpu_count() or 1)))
+PAGE_CACHE_SIZE = int(os.environ.get('PDF_PAGE_CACHE_SIZE', 2048))
+
+_page_cache = OrderedDict()  # (document sha256, page number) -> text
+_page_cache_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def load_resume(file_path):
     if file_path.endswith(".pdf"):
         return extract_text_from_pdf(file_path)
     else:
         with open(file_path, 'r', encoding='utf-8') as f:
             return f.read()
 
-def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    doc.close()
-    return text.strip()
+
+def _read_source(source):
+    # Accept a path, raw bytes, or any object with read() (werkzeug FileStorage, BytesIO, open file)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, 'read'):
+        return source.read()
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server process runs request, sweeper and compression threads, and a
+            # forked child could inherit a lock one of them held at fork time
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _extract_range(data, start, stop):
+    # Runs in a worker process: open the document from bytes and extract pages [start, stop)
+    import fitz
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        return [doc[i].get_text() for i in range(start, stop)]
+    finally:
+        doc.close()
+
+
+def _cached_page(digest, page_no):
+    with _page_cache_lock:
+        text = _page_cache.get((digest, page_no))
+        if text is not None:
+            _page_cache.move_to_end((digest, page_no))
+        return text
+
+
+def _cache_page(digest, page_no, text):
+    with _page_cache_lock:
+        _page_cache[(digest, page_no)] = text
+        while len(_page_cache) > PAGE_CACHE_SIZE:
+            _page_cache.popitem(last=False)
+
+
+def iter_pdf_pages(source, workers=None):
+    """Yield the text of each page, in order, as soon as it is extracted.
+
+    `source` may be a path, bytes or a readable stream. Pages already seen
+    for the same document bytes come from the page cache; large documents
+    are extracted by a process pool in contiguous page ranges.
+    """
+    # fitz is imported on the first PDF rather than at startup
+    import fitz
+    data = _read_source(source)
+    digest = hashlib.sha256(data).hexdigest()
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        page_count = doc.page_count
+        cached = [_cached_page(digest, i) for i in range(page_count)]
+        missing = [i for i, text in enumerate(cached) if text is None]
+        workers = PDF_WORKERS if workers is None else workers
+        if workers > 1 and len(missing) >= PARALLEL_MIN_PAGES:
+            doc.close()
+            doc = None
+            yield from _iter_parallel(data, digest, cached, missing, workers)
+            return
+        for i in range(page_count):
+            text = cached[i]
+            if text is None:
+                text = doc[i].get_text()
+                _cache_page(digest, i, text)
+            yield text
+    finally:
+        if doc is not None:
+            doc.close()
+
+
+def _iter_parallel(data, digest, cached, missing, workers):
+    start, stop = missing[0], missing[-1] + 1
+    step = max(1, -(-(stop - start) // workers))
+    pool = _get_pool()
+    futures = [(s, pool.submit(_extract_range, data, s, min(s + step, stop))) for s in range(start, stop, step)]
+    for i in range(start):
+        yield cached[i]
+    for range_start, future in futures:
+        for offset, text in enumerate(future.result()):
+            _cache_page(digest, range_start + offset, text)
+            yield text
+    for i in range(stop, len(cached)):
+        yield cached[i]
+
+
+def extract_text_from_pdf(source, workers=None):
+    """Full text of a PDF given as a path, bytes or readable stream."""
+    return "".join(iter_pdf_pages(source, workers)).strip()
@@ -0,0 +1,317 @@
+# Setup and request handling shared by api_server (Flask) and async_server (Quart); each server
+# keeps only its framework I/O. Import after robust_load_dotenv(): settings are read at import.
+import atexit
+import json
+import logging
+import os
+import platform
+
+from werkzeug.utils import secure_filename
+
+import metrics
+from metrics import stage
+from answer_cache import AnswerCache, cache_scope
+from auth_cache import AuthCache
+from gpt_engine import EMPTY_RESUME_ANSWER
+from resume_cache import ResumeRegistry
+from resume_parser import extract_text_from_pdf
+from session_store import SessionStore
+from upload_store import UploadStore
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_DIR = os.environ.get('UPLOAD_DIR', os.path.join(BASE_DIR, 'uploads'))
+# Requests with a larger Content-Length are refused with 413 before the body is read
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 16 * 1024 * 1024))
+# Original uploads, spooled in memory while small and kept on disk under their sha256
+UPLOAD_STORE_ENABLED = os.environ.get('UPLOAD_STORE', '1') != '0'
+# Answers to repeated questions: Global mode shares one scope, Smart mode is scoped per resume
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE', '1') != '0'
+# Identical questions arriving while one is already being answered share its OpenAI call
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT', '1') != '0'
+# /ask_batch: questions per request, and batch questions answered at once across all requests
+ASK_BATCH_MAX_QUESTIONS = int(os.environ.get('ASK_BATCH_MAX_QUESTIONS', 25))
+ASK_BATCH_WORKERS = int(os.environ.get('ASK_BATCH_WORKERS', 8))
+
+RESUME_EXPIRED_ANSWER = 'Your resume is no longer cached on the server. Please upload it again.'
+NO_CREDITS_ANSWER = 'No credits left. Please purchase more credits to continue.'
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def is_delivered(answer):
+    # A real answer, as opposed to an error or blocked placeholder: only these are cached,
+    # remembered in the session or kept as charged
+    return bool(answer) and not answer.startswith('[Error')
+
+
+def parse_resume_bytes(data, filename):
+    # Always use the same logic as desktop: parse PDF or text, straight from the uploaded bytes
+    if filename.lower().endswith('.pdf'):
+        with stage('pdf_parse'):
+            return extract_text_from_pdf(data)
+    # Try to parse as text, fallback to empty string if error
+    try:
+        return data.decode('utf-8')
+    except Exception:
+        return ''
+
+
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def upload_too_large_body():
+    return {'success': False, 'answer': 'The uploaded file is too large.',
+            'message': f'Uploads are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB'}
+
+
+def parse_ask_history(history):
+    # Multipart bodies carry history as a JSON string
+    if not history:
+        return []
+    try:
+        return json.loads(history)
+    except Exception:
+        return []
+
+
+def engine_kwargs(params):
+    entry = params['entry']
+    return {
+        'resume_text': params['resume_text'],
+        'mode': params['mode'],
+        'history': params['history'],
+        'resume_keywords': entry.keywords if entry else None,
+        'resume_index': entry.index if entry else None,
+        'user': params['email'],
+    }
+
+
+def ask_body(params, answer):
+    body = {'answer': answer}
+    if params['multipart'] and params['mode'] == 'resume':
+        body.update({'resume_text': params['resume_text'], 'resume_id': params['resume_id']})
+    if params['session_id']:
+        body['session_id'] = params['session_id']
+    return body
+
+
+def batch_params(email, question, mode, entry):
+    # Per-question params for /ask_batch, shaped like Services.ask_params so the /ask helpers apply
+    return {
+        'email': email,
+        'question': question,
+        'mode': mode,
+        'history': None,
+        'session_id': None,
+        'resume_text': entry.text if entry else None,
+        'resume_id': entry.resume_id if entry else None,
+        'entry': entry,
+        'multipart': False,
+    }
+
+
+def batch_questions(questions, multipart):
+    """Clean the /ask_batch question list. Returns (questions, None) or (None, (body, status))."""
+    if multipart and len(questions) == 1 and questions[0].lstrip().startswith('['):
+        try:
+            questions = json.loads(questions[0])
+        except ValueError:
+            return None, ({'success': False, 'message': 'questions must be a JSON list'}, 400)
+    if not isinstance(questions, list):
+        return None, ({'success': False, 'message': 'questions must be a list'}, 400)
+    questions = [q.strip() for q in questions if isinstance(q, str) and q.strip()]
+    if not questions:
+        return None, ({'success': False, 'message': 'No questions provided'}, 400)
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        return None, ({'success': False, 'message': f'At most {ASK_BATCH_MAX_QUESTIONS} questions per batch'}, 400)
+    return questions, None
+
+
+def batch_mode(data, entry):
+    """Batch mode, checked before charging. Returns (mode, None) or (None, (body, status))."""
+    mode = 'resume' if data.get('mode', 'resume') == 'resume' else 'global'
+    if mode == 'resume' and (entry is None or not (entry.text or '').strip()):
+        # Smart mode without resume text can only answer EMPTY_RESUME_ANSWER
+        return None, ({'success': False, 'message': EMPTY_RESUME_ANSWER, 'resume_text': ''}, 422)
+    return mode, None
+
+
+class BatchCharge:
+    """Credits charged up front for an /ask_batch, of which only delivered answers are kept.
+
+    owed is what is still to refund: failed answers, plus questions left unsent when the
+    client disconnects mid-stream. It drops to 0 once the server marks the charge settled.
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.delivered = 0
+        self.settled = False
+
+    def record(self, answer):
+        if is_delivered(answer):
+            self.delivered += 1
+
+    @property
+    def owed(self):
+        return 0 if self.settled else self.total - self.delivered
+
+
+class Services:
+    """The caches and stores one server process shares across requests, configured from env vars."""
+
+    def __init__(self):
+        # Parsed resumes keyed by content hash, so Smart mode uploads once and then sends resume_id
+        self.resume_registry = ResumeRegistry(
+            max_entries=int(os.environ.get('RESUME_CACHE_ENTRIES', 256)),
+            max_bytes=int(os.environ.get('RESUME_CACHE_BYTES', 64 * 1024 * 1024)),
+            ttl=int(os.environ.get('RESUME_CACHE_TTL', 6 * 3600)),
+        )
+        # Recently verified logins, so credit calls don't re-run PBKDF2 and re-read the user
+        self.auth_cache = AuthCache(ttl=int(os.environ.get('AUTH_CACHE_TTL', 300)))
+        # Conversation history kept server-side; clients that send session_id only post the new question
+        self.session_store = SessionStore(
+            ttl=int(os.environ.get('SESSION_TTL', 2 * 3600)),
+            history_tokens=int(os.environ.get('SESSION_HISTORY_TOKENS', 1500)),
+            summary_tokens=int(os.environ.get('SESSION_SUMMARY_TOKENS', 300)),
+        )
+        self.answer_cache = AnswerCache(
+            max_entries=int(os.environ.get('ANSWER_CACHE_ENTRIES', 5000)),
+            ttl=int(os.environ.get('ANSWER_CACHE_TTL', 7 * 24 * 3600)),
+            similarity=float(os.environ.get('ANSWER_CACHE_SIMILARITY', 0)),
+            path=os.environ.get('ANSWER_CACHE_PATH') or None,
+        )
+        atexit.register(self.answer_cache.save)
+        self.upload_store = UploadStore(
+            UPLOAD_DIR,
+            max_bytes=int(os.environ.get('UPLOAD_STORE_BYTES', 512 * 1024 * 1024)),
+            max_age=int(os.environ.get('UPLOAD_STORE_MAX_AGE', 7 * 24 * 3600)),
+            spool_bytes=int(os.environ.get('UPLOAD_SPOOL_BYTES', 1024 * 1024)),
+            max_upload_bytes=MAX_UPLOAD_BYTES,
+            sweep_interval=int(os.environ.get('UPLOAD_SWEEP_INTERVAL', 300)),
+        )
+
+    def register_collectors(self, engine, inflight):
+        metrics.register_collector('engine', engine.get_stats)
+        metrics.register_collector('llm_scheduler', engine.scheduler.stats)
+        metrics.register_collector('resume_cache', self.resume_registry.stats)
+        metrics.register_collector('answer_cache', self.answer_cache.stats)
+        metrics.register_collector('auth_cache', self.auth_cache.stats)
+        metrics.register_collector('sessions', self.session_store.stats)
+        metrics.register_collector('single_flight', inflight.stats)
+        metrics.register_collector('uploads', self.upload_store.stats)
+
+    def health(self, engine, inflight):
+        return {
+            'status': 'ok',
+            'os': platform.system(),
+            'release': platform.release(),
+            'platform': platform.platform(),
+            'engine': engine.get_stats(),
+            'answer_cache': self.answer_cache.stats(),
+            'auth_cache': self.auth_cache.stats(),
+            'single_flight': inflight.stats(),
+        }
+
+    def register_resume(self, resume_file):
+        """Spool, hash, parse (on a cache miss) and store an uploaded resume; returns (entry, cached).
+
+        Blocking: the async server runs it on a worker thread.
+        """
+        filename = secure_filename(resume_file.filename or 'resume')
+        with stage('upload_read'):
+            upload = self.upload_store.receive(resume_file.stream, filename)
+        try:
+            # upload.read is only called on a registry miss
+            entry, cached = self.resume_registry.get_or_parse(upload.read, filename, parse_resume_bytes, upload.digest)
+            if UPLOAD_STORE_ENABLED:
+                self.upload_store.store(upload)
+        finally:
+            upload.close()
+        resume_text = entry.text
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Resume file received: %s (resume_id=%s, cached=%s, text_len=%d)",
+                      filename, entry.resume_id[:12], cached, len(resume_text) if resume_text else 0)
+            log.debug("Resume text preview (first 200 chars):\n%s", (resume_text or '')[:200])
+        if not resume_text or not resume_text.strip():
+            log.warning("Resume text is empty after extraction for file: %s", filename)
+        return entry, cached
+
+    def batch_resume(self, resume_file, resume_text, resume_id):
+        """Resolve the one resume a batch shares. Returns (entry, None) or (None, (body, status)).
+
+        Blocking for uploads and pasted text; the async server runs it on a worker thread.
+        """
+        if resume_file:
+            return self.register_resume(resume_file)[0], None
+        if resume_text:
+            return self.resume_registry.get_or_parse(resume_text.encode('utf-8'), 'resume.txt', parse_resume_bytes)[0], None
+        if resume_id:
+            entry = self.resume_registry.get(resume_id)
+            if entry is None:
+                return None, ({'success': False, 'message': RESUME_EXPIRED_ANSWER, 'resume_expired': True}, 404)
+            return entry, None
+        return None, None
+
+    def ask_params(self, data, multipart, email, entry):
+        """Validate an /ask body once any uploaded resume is registered (`entry`).
+
+        Returns (params, None) on success or (None, (body, status)).
+        """
+        question = data.get('question', '')
+        mode = data.get('mode', 'global')
+        history = parse_ask_history(data.get('history', None)) if multipart else data.get('history', [])
+        session_id = data.get('session_id', None)
+        resume_id = data.get('resume_id', None)
+        resume_text = None if multipart else data.get('resume', None)
+        if entry is not None:
+            resume_id, resume_text = entry.resume_id, entry.text
+        elif resume_id and not resume_text:
+            entry = self.resume_registry.get(resume_id)
+            if entry is None:
+                return None, ({'answer': RESUME_EXPIRED_ANSWER, 'resume_expired': True}, 404)
+            resume_text = entry.text
+        if not question:
+            return None, ({'answer': 'No question provided.'}, 400)
+        if multipart:
+            # Smart mode uploads always answer from the resume; anything else is Global mode
+            if mode == 'resume':
+                log.debug("Smart mode requested - using resume context (resume_text_len=%d)",
+                          len(resume_text) if resume_text else 0)
+                if not resume_text or not resume_text.strip():
+                    return None, ({'answer': EMPTY_RESUME_ANSWER, 'resume_text': ''}, 422)
+            else:
+                mode = 'global'
+        if session_id is not None:
+            # Server-side history replaces whatever the client sent
+            session_id = self.session_store.ensure(session_id)
+            history = self.session_store.history(session_id)
+        return {
+            'email': email,
+            'question': question,
+            'mode': mode,
+            'history': history,
+            'session_id': session_id,
+            'resume_text': resume_text,
+            'resume_id': resume_id,
+            'entry': entry,
+            'multipart': multipart,
+        }, None
+
+    def cache_scope(self, params):
+        if not ANSWER_CACHE_ENABLED:
+            return None
+        return cache_scope(params['question'], params['mode'], params['history'], params['resume_id'], params['resume_text'])
+
+    def cached_answer(self, params, scope):
+        return self.answer_cache.get(params['question'], scope) if scope else None
+
+    def cache_answer(self, scope, question, answer):
+        if scope and is_delivered(answer) and answer != EMPTY_RESUME_ANSWER:
+            self.answer_cache.put(question, answer, scope)
+
+    def remember_turn(self, params, answer):
+        if params['session_id'] and is_delivered(answer):
+            self.session_store.append(params['session_id'], params['question'], answer)
@@ -0,0 +1,110 @@
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from resume_index import estimate_tokens
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _first_sentence(text, limit=160):
+    sentence = SENTENCE_RE.split((text or '').strip(), 1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + '...'
+
+
+class Session:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.turns = deque()  # (question, answer, tokens)
+        self.turn_tokens = 0
+        self.summary = deque()  # one line per folded turn
+        self.summary_tokens = 0
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """Server-side conversation history so clients only send the new question.
+
+    Each session keeps the most recent turns within `history_tokens`; turns that
+    fall out of the window are folded into a short extractive summary (first
+    sentence of question and answer), itself capped at `summary_tokens`.
+    """
+
+    def __init__(self, max_sessions=10000, ttl=2 * 3600, history_tokens=1500, summary_tokens=300):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ensure(self, session_id=None):
+        """Return a live session id, creating a new session if `session_id` is unknown or expired."""
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                session_id = uuid.uuid4().hex
+                self._sessions[session_id] = Session(session_id)
+                self._evict()
+            return session_id
+
+    def history(self, session_id):
+        """Messages to splice in before the new question: summary first, then recent turns."""
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return []
+            messages = []
+            if session.summary:
+                messages.append({
+                    "role": "system",
+                    "content": "Summary of earlier questions in this interview:\n" + "\n".join(session.summary),
+                })
+            for question, answer, _ in session.turns:
+                messages.append({"role": "user", "content": question})
+                messages.append({"role": "assistant", "content": answer})
+            return messages
+
+    def append(self, session_id, question, answer):
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return
+            tokens = estimate_tokens(question) + estimate_tokens(answer)
+            session.turns.append((question, answer, tokens))
+            session.turn_tokens += tokens
+            # Always keep the latest turn verbatim, even if it alone is over budget
+            while session.turn_tokens > self.history_tokens and len(session.turns) > 1:
+                old_q, old_a, old_tokens = session.turns.popleft()
+                session.turn_tokens -= old_tokens
+                line = f"Q: {_first_sentence(old_q)} A: {_first_sentence(old_a)}"
+                session.summary.append(line)
+                session.summary_tokens += estimate_tokens(line)
+                while session.summary_tokens > self.summary_tokens and len(session.summary) > 1:
+                    session.summary_tokens -= estimate_tokens(session.summary.popleft())
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'sessions': len(self._sessions)}
+
+    def _get(self, session_id):
+        session = self._sessions.get(session_id) if session_id else None
+        if session is None:
+            return None
+        now = time.monotonic()
+        if self.ttl and now - session.last_used > self.ttl:
+            del self._sessions[session_id]
+            return None
+        session.last_used = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict(self):
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
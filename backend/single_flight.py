@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import json
+import threading
+
+
+def flight_key(question, mode, resume_id=None, resume_text=None, history=None):
+    """Key under which identical in-flight /ask requests share one upstream call."""
+    if resume_id is None and resume_text:
+        resume_id = hashlib.sha256(resume_text.encode('utf-8')).hexdigest()
+    history_digest = None
+    if history:
+        history_digest = hashlib.sha256(json.dumps(history, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return (mode, (question or '').strip(), resume_id, history_digest)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one.
+
+    The first caller for a key runs `fn`; callers arriving while it is still
+    running block and receive the same result (or exception). Nothing is kept
+    once the call finishes, so this never serves stale answers.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.collapsed = 0
+
+    def do(self, key, fn):
+        """Returns (result, shared); shared is True when another caller did the work."""
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if shared:
+                self.collapsed += 1
+            else:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._calls), 'leaders': self.leaders, 'collapsed': self.collapsed}
+
+
+class AsyncSingleFlight:
+    """asyncio version of SingleFlight for async_server."""
+
+    def __init__(self):
+        self._tasks = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    async def do(self, key, coro_fn):
+        task = self._tasks.get(key)
+        shared = task is not None
+        if shared:
+            self.collapsed += 1
+        else:
+            self.leaders += 1
+            task = self._tasks[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # shield: one client disconnecting must not cancel the answer the others are waiting for
+        return await asyncio.shield(task), shared
+
+    def stats(self):
+        return {'in_flight': len(self._tasks), 'leaders': self.leaders, 'collapsed': self.collapsed}
@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+
+from metrics import Counter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+STATIC_REQUESTS = Counter('static_requests_total', 'Frontend assets served by the static fast path', ['encoding'])
+
+# Content-hashed bundle names from the React build, e.g. main.3f2a9c1b.js / 453.e8f1a2b3.chunk.css
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{8,}\.")
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/manifest+json',
+                      'image/svg+xml', 'application/xml')
+
+
+class Asset:
+    __slots__ = ('body', 'etag', 'content_type', 'cache_control', 'variants')
+
+    def __init__(self, body, content_type, cache_control):
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:20]
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.variants = {}  # encoding -> (body, etag), filled in by the compressor thread
+
+
+class StaticAssets:
+    """In-memory copy of the frontend build with precompressed variants.
+
+    Files are read once at startup; gzip (and brotli, when the package is
+    installed) variants are computed on a background thread and used as soon
+    as each is ready. Hashed bundles get a one-year immutable Cache-Control;
+    everything else (index.html, manifest) is revalidated with its ETag.
+    """
+
+    def __init__(self, root, max_file_bytes=8 * 1024 * 1024, min_compress_bytes=512, brotli_quality=11):
+        self.root = root
+        self.max_file_bytes = max_file_bytes
+        self.min_compress_bytes = min_compress_bytes
+        self.brotli_quality = brotli_quality
+        self.assets = {}  # URL path ("/static/js/main.abc123.js") -> Asset
+        self.ready = False
+        if os.path.isdir(root):
+            self._load()
+
+    def _load(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name.endswith(('.gz', '.br')) or os.path.getsize(path) > self.max_file_bytes:
+                    continue
+                with open(path, 'rb') as f:
+                    body = f.read()
+                url = '/' + os.path.relpath(path, self.root).replace(os.sep, '/')
+                content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                if content_type.startswith('text/') or content_type == 'application/javascript':
+                    content_type += '; charset=utf-8'
+                cache_control = IMMUTABLE_CACHE if HASHED_NAME_RE.search(name) else REVALIDATE_CACHE
+                self.assets[url] = Asset(body, content_type, cache_control)
+        if '/index.html' in self.assets:
+            self.assets['/'] = self.assets['/index.html']
+
+    def start_compression(self):
+        """Build compressed variants on a daemon thread, index.html first."""
+        thread = threading.Thread(target=self._compress_all, name='static-compress', daemon=True)
+        thread.start()
+        return thread
+
+    def _compress_all(self):
+        order = sorted(set(self.assets.values()), key=lambda a: a.cache_control != REVALIDATE_CACHE)
+        for asset in order:
+            if len(asset.body) < self.min_compress_bytes or not asset.content_type.startswith(COMPRESSIBLE_TYPES):
+                continue
+            variants = {'gzip': gzip.compress(asset.body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants['br'] = brotli.compress(asset.body, quality=self.brotli_quality)
+            for encoding, body in variants.items():
+                if len(body) < len(asset.body):
+                    asset.variants[encoding] = (body, asset.etag[:-1] + '-' + encoding + '"')
+        self.ready = True
+        log.info("Precompressed %d frontend assets (brotli: %s)", len(self.assets), brotli is not None)
+
+    def stats(self):
+        unique = set(self.assets.values())
+        return {
+            'files': len(unique),
+            'bytes': sum(len(a.body) for a in unique),
+            'bytes_gzip': sum(len(a.variants['gzip'][0]) for a in unique if 'gzip' in a.variants),
+            'bytes_br': sum(len(a.variants['br'][0]) for a in unique if 'br' in a.variants),
+            'ready': 1 if self.ready else 0,
+        }
+
+
+def _accepts(accept_encoding, encoding):
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() == encoding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class StaticMiddleware:
+    """WSGI fast path: answers GET/HEAD for known build files before Flask sees the request.
+
+    Anything else (API routes, unknown paths) goes to the wrapped app, so asset
+    requests never run Flask routing, CORS handling or send_static_file.
+    """
+
+    def __init__(self, app, assets):
+        self.app = app
+        self.assets = assets
+
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD')
+        asset = self.assets.assets.get(environ.get('PATH_INFO', '')) if method in ('GET', 'HEAD') else None
+        if asset is None:
+            return self.app(environ, start_response)
+        body, etag, encoding = asset.body, asset.etag, 'identity'
+        accept = environ.get('HTTP_ACCEPT_ENCODING', '')
+        for candidate in ('br', 'gzip'):
+            variant = asset.variants.get(candidate)
+            if variant is not None and _accepts(accept, candidate):
+                (body, etag), encoding = variant, candidate
+                break
+        headers = [
+            ('Content-Type', asset.content_type),
+            ('Cache-Control', asset.cache_control),
+            ('ETag', etag),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH', '')
+        if if_none_match and (if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]):
+            STATIC_REQUESTS.inc(encoding='not_modified')
+            start_response('304 Not Modified', headers)
+            return [b'']
+        if encoding != 'identity':
+            headers.append(('Content-Encoding', encoding))
+        headers.append(('Content-Length', str(len(body))))
+        STATIC_REQUESTS.inc(encoding=encoding)
+        start_response('200 OK', headers)
+        return [b''] if method == 'HEAD' else [body]
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_scheduler import LLMScheduler, SchedulerBusy, TokenBucket
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(status_code)
+        self.status_code = status_code
+        self.response = FakeResponse(headers or {})
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(60)  # one unit per second, burst of 60
+    now = bucket.updated
+    assert bucket.delay(60, now) == 0
+    bucket.take(60)
+    assert bucket.delay(1, now) == pytest.approx(1.0)
+    assert bucket.delay(1, now + 1.0) == 0
+
+
+def test_token_bucket_unlimited():
+    bucket = TokenBucket(0)
+    bucket.take(10 ** 9)
+    assert bucket.delay(10 ** 9, time.monotonic()) == 0
+
+
+def test_oversized_call_waits_for_a_full_bucket_only():
+    bucket = TokenBucket(60)
+    assert bucket.delay(1000, bucket.updated) == 0
+
+
+def test_round_robin_between_users():
+    scheduler = LLMScheduler(max_concurrency=1)
+    holder = scheduler.acquire('holder', 1)
+    order = []
+
+    def call(user):
+        with scheduler.slot(user, 1):
+            order.append(user)
+
+    threads = []
+    for user in ('a', 'a', 'b'):
+        thread = threading.Thread(target=call, args=(user,))
+        thread.start()
+        threads.append(thread)
+        depth = len(threads)
+        wait_for(lambda: scheduler.stats()['queue_depth'] == depth)
+    scheduler.release(holder)
+    for thread in threads:
+        thread.join(2)
+    assert order == ['a', 'b', 'a']
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_user_rate_limit_rejects_after_max_wait():
+    scheduler = LLMScheduler(user_rpm=1, max_wait=0.1)
+    scheduler.release(scheduler.acquire('a', 10))
+    with pytest.raises(SchedulerBusy):
+        scheduler.acquire('a', 10)
+    # Another user is not held back by a's limit
+    scheduler.release(scheduler.acquire('b', 10))
+    stats = scheduler.stats()
+    assert stats['rejected'] == 1
+    assert stats['queue_depth'] == 0
+    assert stats['in_flight'] == 0
+
+
+def test_cancelled_async_waiter_leaves_no_ticket():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_wait=5)
+        holder = await scheduler.acquire_async('holder', 1)
+        waiter = asyncio.ensure_future(scheduler.acquire_async('a', 1))
+        await asyncio.sleep(0.02)
+        assert scheduler.stats()['queue_depth'] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.stats()['queue_depth'] == 0
+        scheduler.release(holder)
+        ticket = await asyncio.wait_for(scheduler.acquire_async('b', 1), 1)
+        scheduler.release(ticket)
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['in_flight'] == 0
+    assert stats['queue_depth'] == 0
+
+
+def test_cancelled_async_waiter_frees_a_granted_slot():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_wait=5)
+        holder = await scheduler.acquire_async('holder', 1)
+        waiter = asyncio.ensure_future(scheduler.acquire_async('a', 1))
+        await asyncio.sleep(0.02)
+        scheduler.release(holder)
+        # Another thread grants the waiter's ticket before the waiter wakes up and sees it
+        with scheduler._cond:
+            scheduler._dispatch()
+        assert scheduler.stats()['in_flight'] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['in_flight'] == 0
+    assert stats['queue_depth'] == 0
+
+
+def test_retry_delay_honours_retry_after_and_pauses_dispatch():
+    scheduler = LLMScheduler(max_retries=2)
+    assert scheduler.retry_delay(FakeAPIError(429, {'retry-after-ms': '200'}), 0) == pytest.approx(0.2)
+    assert scheduler.stats()['paused'] == 1
+    assert scheduler.retry_delay(FakeAPIError(429), 2) is None
+    assert scheduler.retry_delay(FakeAPIError(400), 0) is None
+    assert scheduler.retry_delay(FakeAPIError(503), 0) <= scheduler.backoff_max
+    assert scheduler.stats()['retries'] == 2
@@ -0,0 +1,201 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class Upload:
+    """An uploaded file held in a SpooledTemporaryFile, with its sha256 computed while reading."""
+
+    def __init__(self, filename, spool, digest, size):
+        self.filename = filename
+        self.digest = digest
+        self.size = size
+        self._spool = spool
+
+    @property
+    def spilled(self):
+        # True once the spool has moved from memory to a temporary file on disk
+        return getattr(self._spool, '_rolled', False)
+
+    def read(self):
+        self._spool.seek(0)
+        return self._spool.read()
+
+    def copy_to(self, f):
+        self._spool.seek(0)
+        while True:
+            chunk = self._spool.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+
+    def close(self):
+        self._spool.close()
+
+
+class UploadStore:
+    """Receives uploads and keeps the originals on disk under content-hash names.
+
+    Uploads are spooled in memory up to `spool_bytes` and spill to a temporary
+    file beyond that; anything over `max_upload_bytes` is rejected while
+    reading. Stored files are named <sha256><ext>, so concurrent uploads of
+    different files never clash and identical files are stored once. A sweeper
+    deletes files older than `max_age` seconds and then the least recently
+    uploaded ones until the directory is under `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, max_age=7 * 24 * 3600,
+                 spool_bytes=1024 * 1024, max_upload_bytes=16 * 1024 * 1024, sweep_interval=300):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.spool_bytes = spool_bytes
+        self.max_upload_bytes = max_upload_bytes
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._bytes_stored = None  # computed by the first sweep
+        self.received = 0
+        self.bytes_received = 0
+        self.spilled = 0
+        self.rejected = 0
+        self.stored = 0
+        self.deduplicated = 0
+        self.evictions = 0
+
+    def receive(self, stream, filename):
+        """Copy `stream` into a spooled Upload; raises UploadTooLarge past max_upload_bytes."""
+        spool = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if self.max_upload_bytes and size > self.max_upload_bytes:
+                    raise UploadTooLarge(filename)
+                digest.update(chunk)
+                spool.write(chunk)
+        except UploadTooLarge:
+            spool.close()
+            with self._lock:
+                self.rejected += 1
+            raise
+        except BaseException:
+            spool.close()
+            raise
+        upload = Upload(filename, spool, digest.hexdigest(), size)
+        with self._lock:
+            self.received += 1
+            self.bytes_received += size
+            if upload.spilled:
+                self.spilled += 1
+        return upload
+
+    def path_for(self, digest, filename=''):
+        ext = os.path.splitext(filename)[1].lower()[:10]
+        return os.path.join(self.directory, digest + ext)
+
+    def store(self, upload):
+        """Persist the upload under its content hash; returns the path."""
+        path = self.path_for(upload.digest, upload.filename)
+        self._ensure_sweeper()
+        if os.path.exists(path):
+            # Same bytes already stored: refresh its age instead of writing it again
+            os.utime(path)
+            with self._lock:
+                self.deduplicated += 1
+            return path
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            upload.copy_to(f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stored += 1
+            if self._bytes_stored is not None:
+                self._bytes_stored += upload.size
+            over = self._bytes_stored is not None and self._bytes_stored > self.max_bytes
+        if over:
+            self.sweep()
+        return path
+
+    def sweep(self):
+        """Delete expired files, then the oldest ones until under max_bytes. Returns files removed."""
+        files = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if name.endswith('.tmp'):
+                continue  # being written by store()
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if os.path.isfile(path):
+                files.append((st.st_mtime, st.st_size, path))
+        files.sort()
+        now = time.time()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            expired = self.max_age and now - mtime > self.max_age
+            if not expired and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._bytes_stored = total
+            self.evictions += removed
+        if removed:
+            log.info("Upload sweep removed %d files, %d bytes stored", removed, total)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'received': self.received,
+                'bytes_received': self.bytes_received,
+                'spilled_to_disk': self.spilled,
+                'rejected': self.rejected,
+                'stored': self.stored,
+                'deduplicated': self.deduplicated,
+                'evictions': self.evictions,
+                'bytes_stored': self._bytes_stored or 0,
+            }
+
+    def _ensure_sweeper(self):
+        # Started on the first stored upload, so importing the server stays cheap
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._sweeper = threading.Thread(target=self._sweep_loop, name='upload-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception:
+                log.exception("Upload sweep failed")
+            time.sleep(self.sweep_interval)
@@ -3,7 +3,8 @@ import './App.css';
 
 
 
-const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+// Unset in the desktop build: the backend serves the UI, so same-origin requests follow whatever port it picked
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || '';
 
 function App() {
   // Logout handler (must be defined before use)
@@ -17,6 +18,8 @@ function App() {
   setAiResponse('');
   setResume(null);
   setResumeFile(null);
+  setResumeId(null);
+  sessionIdRef.current = '';
   setResumeError('');
   setSmartMode(false);
   localStorage.removeItem('email');
@@ -24,8 +27,13 @@ function App() {
   localStorage.setItem('loggedIn', 'false');
   setAuthMode('login');
   setAuthError('');
-  // Optionally, call backend logout endpoint
-  fetch(`${BACKEND_URL}/logout`, { method: 'POST', credentials: 'include' }).catch(()=>{});
+  // Tell the backend so it drops this login from its auth cache
+  fetch(`${BACKEND_URL}/logout`, {
+    method: 'POST',
+    credentials: 'include',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ email })
+  }).catch(()=>{});
   // Always set credits to 0 on logout
   setCredits(0);
   }
@@ -39,6 +47,7 @@ function App() {
   const [speechError, setSpeechError] = useState('');
   const [resume, setResume] = useState(null); // resume text
   const [resumeFile, setResumeFile] = useState(null); // uploaded file
+  const [resumeId, setResumeId] = useState(null); // server-side cache id for the uploaded resume
   const [resumeError, setResumeError] = useState('');
   const [smartMode, setSmartMode] = useState(false);
   // Auth & credits
@@ -86,6 +95,8 @@ function App() {
     }
   }, [resumeFile, smartMode]);
   const recognitionRef = useRef(null);
+  // Backend keeps the conversation history for this id; '' asks it to start a new session
+  const sessionIdRef = useRef('');
   const widgetRef = useRef(null);
   const questionPanelRef = useRef(null);
   const answerPanelRef = useRef(null);
@@ -157,8 +168,13 @@ function App() {
     localStorage.setItem('loggedIn', 'false');
     setAuthMode('login');
     setAuthError('');
-    // Optionally, call backend logout endpoint
-    fetch(`${BACKEND_URL}/logout`, { method: 'POST', credentials: 'include' }).catch(()=>{});
+    // Tell the backend so it drops this login from its auth cache
+    fetch(`${BACKEND_URL}/logout`, {
+      method: 'POST',
+      credentials: 'include',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ email })
+    }).catch(()=>{});
     // Always set credits to 0 on logout
     setCredits(0);
   }
@@ -313,14 +329,12 @@ function App() {
     }
     setAnswers([]); // Clear previous answer
     setAiResponse('Thinking...');
-    // Build conversation history for context chaining
-    const history = questions.map((q, i) => ({
-      role: 'user', content: q
-    })).concat(
-      answers.map((a, i) => ({
-        role: 'assistant', content: a
-      }))
-    );
+    // Conversation history lives on the backend, keyed by session id
+    const rememberSession = (d) => {
+      if (d && d.session_id) {
+        sessionIdRef.current = d.session_id;
+      }
+    };
     let res, data;
     try {
       if (smartMode) {
@@ -329,17 +343,32 @@ function App() {
           setAnswers(['Error: Please upload a valid resume before using Smart mode.']);
           return;
         }
-        // Use FormData for file upload in Smart mode
-        const formData = new FormData();
-        formData.append('question', question);
-        formData.append('mode', 'resume');
-        formData.append('history', JSON.stringify(history));
-        formData.append('resume', resumeFile); // Always send resume file
-        res = await fetch(`${BACKEND_URL}/ask`, {
-          method: 'POST',
-          body: formData
-        });
-        data = await res.json();
+        // Use FormData in Smart mode; the file is only sent until the backend has cached it
+        const sendSmart = async (withFile) => {
+          const formData = new FormData();
+          formData.append('question', question);
+          formData.append('mode', 'resume');
+          formData.append('session_id', sessionIdRef.current);
+          if (withFile) {
+            formData.append('resume', resumeFile);
+          } else {
+            formData.append('resume_id', resumeId);
+          }
+          const r = await fetch(`${BACKEND_URL}/ask`, {
+            method: 'POST',
+            body: formData
+          });
+          return r.json();
+        };
+        data = await sendSmart(!resumeId);
+        if (data.resume_expired) {
+          // Backend evicted the cached resume, upload it again
+          data = await sendSmart(true);
+        }
+        rememberSession(data);
+        if (data.resume_id) {
+          setResumeId(data.resume_id);
+        }
         // If backend extracted resume text, update resume state
         if (data.resume_text) {
           setResume(data.resume_text);
@@ -368,10 +397,11 @@ function App() {
               question,
               resume: '',
               mode: 'global',
-              history
+              session_id: sessionIdRef.current
             }),
           });
           const generalData = await generalRes.json();
+          rememberSession(generalData);
           setAiResponse('');
           setAnswers([generalData.answer || 'No response.']);
           setResumeError('');
@@ -388,10 +418,11 @@ function App() {
             question,
             resume: '',
             mode: 'global',
-            history // send conversation history for context
+            session_id: sessionIdRef.current // backend supplies conversation history for context
           }),
         });
         data = await res.json();
+        rememberSession(data);
         setAiResponse('');
         setAnswers([data.answer || 'No response.']);
         setResumeError('');
@@ -411,6 +442,8 @@ function App() {
     const file = e.target.files[0];
     if (!file) return;
     setResumeFile(file);
+    setResumeId(null);
+    sessionIdRef.current = ''; // new resume, new conversation
     setResume(null);
     setResumeError('');
     setAnswers([]);